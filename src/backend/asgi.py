@@ -0,0 +1,270 @@
+"""ASGI entry point: ``uvicorn asgi:application`` (or ``SERVER_MODE=asgi python main.py``).
+
+``POST /api/v1/chat/stream`` is served natively on the event loop and talks to
+Ollama through one shared ``httpx.AsyncClient`` with keep-alive pooling, so a
+slow generation holds a coroutine rather than a worker thread. Blocking steps
+(session store, retrieval, cache) run in the thread pool. Every other route is
+passed through to the Flask app.
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from http import HTTPStatus
+
+import httpx
+from anyio import to_thread
+from asgiref.wsgi import WsgiToAsgi
+
+import main
+from main import app
+
+logger = logging.getLogger(__name__)
+
+flask_app = WsgiToAsgi(app)
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+    (b'access-control-allow-origin', b'*')
+]
+
+# Created lazily inside the running event loop
+_state = {'client': None, 'slots': None}
+
+
+def ollama_client():
+    """Shared async HTTP client with keep-alive connection pooling to Ollama"""
+    if _state['client'] is None:
+        _state['client'] = httpx.AsyncClient(
+            base_url=app.config['OLLAMA_BASE_URL'],
+            timeout=httpx.Timeout(app.config['OLLAMA_TIMEOUT'], connect=app.config['OLLAMA_CONNECT_TIMEOUT']),
+            limits=httpx.Limits(
+                max_connections=app.config['OLLAMA_MAX_CONNECTIONS'],
+                max_keepalive_connections=app.config['OLLAMA_MAX_KEEPALIVE']
+            )
+        )
+    return _state['client']
+
+
+def stream_slots():
+    """Semaphore capping concurrent streaming generations"""
+    if _state['slots'] is None:
+        _state['slots'] = asyncio.Semaphore(app.config['ASGI_MAX_CONCURRENCY'])
+    return _state['slots']
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def send_json(send, status, payload, headers=None):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': int(status),
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*')
+        ] + (headers or [])
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def watch_disconnect(receive, disconnected):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            disconnected.set()
+            return
+
+
+def prepare_stream(trace, memory, question, collection_name, filters=None):
+    """Blocking part of a streaming chat: plan and check the response cache"""
+    with main.activate(trace):
+        plan = main.plan_chat(question, memory, collection_name, filters)
+        answer, tier, key = main.lookup_answer(plan)
+    return plan, answer, tier, key
+
+
+async def chat_stream(scope, receive, send):
+    """Async counterpart of main.chat_stream with the same SSE events"""
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    if not headers.get('content-type', '').startswith('application/json'):
+        await send_json(send, HTTPStatus.BAD_REQUEST, {'status': 'error', 'message': 'Content-Type must be application/json'})
+        return
+    try:
+        data = json.loads(await read_body(receive) or b'{}')
+    except ValueError:
+        await send_json(send, HTTPStatus.BAD_REQUEST, {'status': 'error', 'message': 'Invalid JSON body'})
+        return
+
+    session_id = headers.get('x-session-id') or (scope.get('client') or ('unknown',))[0]
+    idempotency_key = headers.get('x-idempotency-key')
+    question = data.get('question', '')
+    collection_name = data.get('collection_name')
+    filters = data.get('filters')
+    if filters is not None:
+        try:
+            main.validate_filters(filters)
+        except ValueError as e:
+            await send_json(send, HTTPStatus.BAD_REQUEST, {'status': 'error', 'message': str(e)})
+            return
+
+    # Read the idempotency record and the session context in one round trip
+    keys = [main.context_key(session_id)]
+    if idempotency_key:
+        keys.append(main.idempotency_record_key(idempotency_key))
+    records = await to_thread.run_sync(main.session_store.get_many, keys)
+
+    if idempotency_key:
+        # A retry with the same key replays the stored answer instead of generating again
+        record = records.get(main.idempotency_record_key(idempotency_key))
+        if record:
+            if record['status_code'] != HTTPStatus.OK:
+                await send_json(send, record['status_code'], record['response'])
+                return
+            await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+            for event in main.replay_events(record):
+                await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+    slots = stream_slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=app.config['ASGI_QUEUE_TIMEOUT'])
+    except asyncio.TimeoutError:
+        await send_json(send, HTTPStatus.SERVICE_UNAVAILABLE, {'status': 'error', 'message': 'Server is busy, please retry'},
+                        headers=[(b'retry-after', str(app.config['ASGI_QUEUE_TIMEOUT']).encode())])
+        return
+
+    trace = main.chat_metrics.start('chat_stream', headers.get('x-trace-id'))
+    try:
+        start_time = time.perf_counter()
+        try:
+            entry = records.get(main.context_key(session_id))
+            memory = main.SessionMemory.from_dict(entry['memory']) if entry else main.SessionMemory()
+            plan, answer, tier, key = await to_thread.run_sync(prepare_stream, trace, memory, question, collection_name, filters)
+        except Exception as e:
+            logger.error(f"Error in streaming chat: {str(e)}")
+            await send_json(send, HTTPStatus.INTERNAL_SERVER_ERROR, {'status': 'error', 'message': 'Internal server error', 'error': str(e)})
+            return
+
+        ticket = None
+        try:
+            if answer is None:
+                try:
+                    # Blocks a worker thread, not the event loop, while queued for a model slot
+                    ticket = await to_thread.run_sync(main.generation_scheduler.acquire, session_id)
+                except main.Overloaded as e:
+                    logger.warning(f"Shedding streaming chat request for session {session_id}: {str(e)}")
+                    await send_json(send, e.status, {'status': 'error', 'message': str(e), 'retry_after': e.retry_after},
+                                    headers=[(b'retry-after', str(e.retry_after).encode())])
+                    return
+
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': SSE_HEADERS + ([(b'x-trace-id', trace.trace_id.encode('latin-1'))] if app.config['METRICS_TRACE_HEADERS'] else [])
+            })
+
+            async def emit(event, payload):
+                await send({'type': 'http.response.body', 'body': main.sse_event(event, payload).encode('utf-8'), 'more_body': True})
+
+            disconnected = asyncio.Event()
+            watcher = asyncio.ensure_future(watch_disconnect(receive, disconnected))
+            try:
+                await emit('sources', {'scenario': plan['scenario'], 'documents': main.document_sources(plan['documents'])})
+                first_token_time = None
+                chunks = 0
+                if answer is not None:
+                    first_token_time = time.perf_counter()
+                    chunks = 1
+                    full_answer = answer
+                    await emit('token', {'token': answer})
+                else:
+                    parts = []
+                    payload = {'model': app.config['OLLAMA_MODEL'], 'prompt': main.plan_prompt(plan), 'stream': True}
+                    generation_start = time.perf_counter()
+                    try:
+                        async with ollama_client().stream('POST', '/api/generate', json=payload) as response:
+                            response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                if disconnected.is_set():
+                                    # Leaving the block closes the connection, which stops generation in Ollama
+                                    logger.info(f"Client disconnected, stopping generation for session {session_id}")
+                                    return
+                                if not line:
+                                    continue
+                                message = json.loads(line)
+                                if message.get('done'):
+                                    main.chat_metrics.record_usage(message)
+                                token = message.get('response', '')
+                                if not token:
+                                    continue
+                                if first_token_time is None:
+                                    first_token_time = time.perf_counter()
+                                    trace.record('llm_ttft', first_token_time - generation_start)
+                                chunks += 1
+                                parts.append(token)
+                                await emit('token', {'token': token})
+                    except (httpx.HTTPError, ValueError) as e:
+                        logger.error(f"Error in streaming chat: {str(e)}")
+                        await emit('error', {'message': 'Internal server error', 'error': str(e)})
+                        return
+                    finally:
+                        trace.record('llm_total', time.perf_counter() - generation_start)
+                    full_answer = ''.join(parts)
+                    await to_thread.run_sync(main.store_answer, plan, key, full_answer)
+
+                await to_thread.run_sync(main.finish_chat, session_id, memory, question, full_answer, idempotency_key)
+                end_time = time.perf_counter()
+                await emit('done', {
+                    'session_id': session_id,
+                    'cache': tier,
+                    'chunks': chunks,
+                    'time_to_first_token_ms': round(1000 * (first_token_time - start_time), 1) if first_token_time else None,
+                    'total_ms': round(1000 * (end_time - start_time), 1),
+                    'timestamp': datetime.now().isoformat()
+                })
+            finally:
+                watcher.cancel()
+                if not disconnected.is_set():
+                    await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Give the model slot back whatever fails after acquiring it, including the response start
+            if ticket is not None:
+                ticket.release()
+    finally:
+        main.chat_metrics.finish(trace)
+        slots.release()
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            main.start_warmup()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _state['client'] is not None:
+                await _state['client'].aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(scope, receive, send)
+    elif scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] == '/api/v1/chat/stream':
+        await chat_stream(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
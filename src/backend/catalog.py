@@ -0,0 +1,142 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Chroma's own rules: 3-63 characters, alphanumerics plus . _ -, starting and ending alphanumeric
+COLLECTION_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{1,61}[A-Za-z0-9]$')
+
+
+class CollectionNotFound(KeyError):
+    """Raised when a collection does not exist"""
+
+
+class CollectionExists(ValueError):
+    """Raised when creating a collection that already exists"""
+
+
+def valid_collection_name(name):
+    return bool(name) and isinstance(name, str) and bool(COLLECTION_NAME_PATTERN.match(name)) and '..' not in name
+
+
+class CollectionCatalog:
+    """In-memory map of Chroma collection names to their record counts.
+
+    Filled from Chroma on first use (without opening it when the database does
+    not exist yet) and updated by ``refresh`` after every local write, so chat
+    can tell an empty or missing collection apart from a populated one without
+    embedding the question. Other worker processes write to the same store,
+    so a missing or empty entry is re-counted on every lookup (a cheap count,
+    no embedding) and populated ones are re-counted once they are older than
+    ``ttl`` seconds.
+    """
+
+    def __init__(self, registry, ttl=30):
+        self.registry = registry
+        self.ttl = ttl
+        self._sizes = None
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        """Record count straight from Chroma, or None if the collection does not exist"""
+        if not os.path.exists(self.registry.db_path):
+            return None
+        try:
+            # get_collection (unlike the registry's get_or_create) does not create missing collections
+            return self.registry.client.get_collection(name).count()
+        except Exception:
+            # Dropped by another worker: forget the cached handle too
+            self.registry.invalidate(name)
+            return None
+
+    def _set(self, name, size):
+        with self._lock:
+            if size is None:
+                self._sizes.pop(name, None)
+                self._checked.pop(name, None)
+            else:
+                self._sizes[name] = size
+                self._checked[name] = time.monotonic()
+        return size
+
+    def load(self):
+        """Re-list every collection from Chroma and return ``{name: count}``"""
+        sizes = {}
+        if os.path.exists(self.registry.db_path):
+            for collection in self.registry.client.list_collections():
+                # Older chromadb returns Collection objects, newer ones just the names
+                name = getattr(collection, 'name', collection)
+                size = self._count(name)
+                if size is not None:
+                    sizes[name] = size
+        now = time.monotonic()
+        with self._lock:
+            self._sizes = dict(sizes)
+            self._checked = {name: now for name in sizes}
+        return sizes
+
+    def size(self, name):
+        """Record count of a collection, or None if it does not exist"""
+        with self._lock:
+            loaded = self._sizes is not None
+            size = self._sizes.get(name) if loaded else None
+            fresh = size and time.monotonic() - self._checked.get(name, 0) < self.ttl
+        if not loaded:
+            size = self.load().get(name)
+            fresh = True
+        if fresh:
+            return size
+        return self._set(name, self._count(name))
+
+    def refresh(self, name):
+        """Re-count a collection after it was written to"""
+        if self._sizes is None:
+            self.load()
+        return self._set(name, self._count(name))
+
+    def create(self, name):
+        if self._sizes is None:
+            self.load()
+        if self._count(name) is not None:
+            raise CollectionExists(name)
+        return self._set(name, self.registry.get_collection(name).count())
+
+    def delete(self, name):
+        if self._sizes is None:
+            self.load()
+        if self._count(name) is None:
+            self._set(name, None)
+            raise CollectionNotFound(name)
+        self.registry.client.delete_collection(name)
+        self.registry.invalidate(name)
+        self._set(name, None)
+
+    def stats(self, name):
+        """Record count and per-source chunk counts of one collection"""
+        size = self.size(name)
+        if size is None:
+            raise CollectionNotFound(name)
+        collection = self.registry.get_collection(name)
+        sources = Counter()
+        record_types = Counter()
+        offset = 0
+        while True:
+            page = collection.get(include=['metadatas'], limit=1000, offset=offset)
+            if not page['ids']:
+                break
+            for metadata in page['metadatas']:
+                metadata = metadata or {}
+                sources[metadata.get('source', '')] += 1
+                record_types[metadata.get('record_type', 'chunk')] += 1
+            offset += len(page['ids'])
+        return {
+            'name': name,
+            'documents': offset,
+            'sources': dict(sources),
+            'record_types': dict(record_types)
+        }
@@ -0,0 +1,305 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, one worker per cache directory
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """Bounded, append-mostly on-disk store of float32 vectors for one embedding model.
+
+    ``<name>.f32`` holds the raw little-endian float32 rows and ``<name>.idx``
+    holds a ``dim=<n>`` header followed by one key per row. Rows are read
+    through a read-only memory map, so opening a large cache only loads the
+    key index into RAM.
+
+    Appends take an exclusive ``flock`` on ``<name>.lock`` and number new rows
+    from the data file's size, so several worker processes can share one
+    cache; each picks up the keys the others appended before writing its own.
+
+    Once an append would take the store past ``max_entries`` rows, it is
+    compacted to the newest half: both files are rewritten to temporary
+    files and swapped in, data first. Other processes notice the new index
+    file and reload it; a crash mid-swap is finished (or rolled back) on the
+    next load.
+    """
+
+    def __init__(self, directory, name, max_entries=100000):
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, f'{name}.f32')
+        self.index_path = os.path.join(directory, f'{name}.idx')
+        self.lock_path = os.path.join(directory, f'{name}.lock')
+        self.max_entries = max_entries
+        self.dim = None
+        self.rows = {}
+        self._count = 0
+        self._index_offset = 0
+        self._inode = None
+        self._data_inode = None
+        self._map = None
+        self.compactions = 0
+        self._lock = threading.Lock()
+        with self._lock, self._file_lock():
+            self._load()
+        if self.rows:
+            logger.info(f"Loaded {len(self.rows)} cached embeddings from {self.index_path}")
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.lock_path, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stored_rows(self):
+        return os.path.getsize(self.data_path) // (4 * self.dim) if os.path.exists(self.data_path) else 0
+
+    def _load(self):
+        """Read the whole index and cut both files back to the rows they agree on.
+
+        A crash between the data and index appends leaves one file longer than
+        the other (or a partial last line); left in place, every later append
+        would land at a row that no longer matches its key.
+        """
+        self.dim = None
+        self.rows = {}
+        self._count = 0
+        self._index_offset = 0
+        self._inode = None
+        self._map = None
+        self._recover_compaction()
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'rb') as f:
+            header = f.readline()
+            body = f.read()
+        if not header.startswith(b'dim=') or not header.endswith(b'\n'):
+            return
+        self.dim = int(header[4:])
+        complete = body[:body.rfind(b'\n') + 1]
+        lines = complete.decode('utf-8').splitlines()
+        rows = min(len(lines), self._stored_rows())
+        if rows != len(lines) or len(complete) != len(body):
+            logger.warning(f"Repairing {self.index_path}: keeping {rows} of {len(lines)} keys after an interrupted write")
+            with open(self.index_path, 'wb') as f:
+                f.write(header + ''.join(f'{line}\n' for line in lines[:rows]).encode('utf-8'))
+        if os.path.exists(self.data_path) and os.path.getsize(self.data_path) != rows * 4 * self.dim:
+            logger.warning(f"Truncating {self.data_path} to {rows} rows after an interrupted write")
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(rows * 4 * self.dim)
+        for row, key in enumerate(lines[:rows]):
+            self.rows[key] = row
+        self._count = rows
+        self._index_offset = os.path.getsize(self.index_path)
+        self._inode = os.stat(self.index_path).st_ino
+        self._data_inode = os.stat(self.data_path).st_ino if os.path.exists(self.data_path) else None
+
+    def _recover_compaction(self):
+        """Finish or roll back a compaction that was interrupted between its two file swaps"""
+        data_tmp, index_tmp = f'{self.data_path}.tmp', f'{self.index_path}.tmp'
+        if os.path.exists(data_tmp):
+            # The data file was not swapped yet, so the old pair is still consistent
+            logger.warning(f"Discarding an interrupted compaction of {self.data_path}")
+            os.unlink(data_tmp)
+            if os.path.exists(index_tmp):
+                os.unlink(index_tmp)
+        elif os.path.exists(index_tmp):
+            logger.warning(f"Completing an interrupted compaction of {self.index_path}")
+            os.replace(index_tmp, self.index_path)
+
+    def _compact(self, incoming):
+        """Keep only the newest rows so that ``incoming`` more fit under ``max_entries``"""
+        keep = min(self._count, self.max_entries // 2, self.max_entries - incoming)
+        keys = [None] * self._count
+        for key, row in self.rows.items():
+            keys[row] = key
+        keys = keys[self._count - keep:] if keep > 0 else []
+        with open(self.data_path, 'rb') as f:
+            f.seek((self._count - len(keys)) * 4 * self.dim)
+            data = f.read(len(keys) * 4 * self.dim)
+        data_tmp, index_tmp = f'{self.data_path}.tmp', f'{self.index_path}.tmp'
+        with open(index_tmp, 'wb') as f:
+            f.write(f'dim={self.dim}\n'.encode('utf-8') + ''.join(f'{key}\n' for key in keys).encode('utf-8'))
+        with open(data_tmp, 'wb') as f:
+            f.write(data)
+        self._map = None
+        os.replace(data_tmp, self.data_path)
+        os.replace(index_tmp, self.index_path)
+        logger.info(f"Compacted {self.data_path} from {self._count} to {len(keys)} rows")
+        self.compactions += 1
+        self._load()
+
+    def _sync(self):
+        """Pick up keys other processes appended since the last read; reload if the files disagree"""
+        if self.dim is None or not os.path.exists(self.index_path) or os.stat(self.index_path).st_ino != self._inode:
+            # Missing, or swapped for a compacted copy by another process
+            self._load()
+            return
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._index_offset)
+            tail = f.read()
+        complete = tail[:tail.rfind(b'\n') + 1]
+        keys = complete.decode('utf-8').splitlines()
+        if len(complete) != len(tail) or self._stored_rows() != self._count + len(keys):
+            self._load()
+            return
+        for key in keys:
+            self.rows[key] = self._count
+            self._count += 1
+        self._index_offset += len(complete)
+
+    def _row(self, row):
+        if self._map is None or row >= self._map.shape[0]:
+            # Re-map after appends so new rows become visible, unless another
+            # process compacted the file since it was loaded: then the row
+            # numbers are stale until the next write reloads the index
+            if os.stat(self.data_path).st_ino != self._data_inode:
+                return None
+            self._map = np.memmap(self.data_path, dtype='<f4', mode='r', shape=(self._count, self.dim))
+        return self._map[row]
+
+    def get(self, key):
+        with self._lock:
+            row = self.rows.get(key)
+            if row is None:
+                return None
+            vector = self._row(row)
+            return vector.tolist() if vector is not None else None
+
+    def put_many(self, items):
+        """Append (key, vector) pairs that are not stored yet"""
+        with self._lock:
+            items = list({key: vector for key, vector in items if key not in self.rows}.items())
+            if not items:
+                return
+            with self._file_lock():
+                self._sync()
+                if self.dim is None:
+                    self.dim = len(items[0][1])
+                    with open(self.index_path, 'w') as f:
+                        f.write(f'dim={self.dim}\n')
+                    if os.path.exists(self.data_path):
+                        os.truncate(self.data_path, 0)
+                    self._index_offset = os.path.getsize(self.index_path)
+                items = [(key, vector) for key, vector in items if key not in self.rows and len(vector) == self.dim]
+                items = items[-self.max_entries:]
+                if not items:
+                    return
+                if self._count + len(items) > self.max_entries:
+                    self._compact(len(items))
+                with open(self.data_path, 'ab') as f:
+                    start = f.seek(0, os.SEEK_END) // (4 * self.dim)
+                    f.write(np.asarray([vector for _, vector in items], dtype='<f4').tobytes())
+                self._data_inode = os.stat(self.data_path).st_ino
+                with open(self.index_path, 'ab') as f:
+                    f.write(''.join(f'{key}\n' for key, _ in items).encode('utf-8'))
+                    self._index_offset = f.tell()
+                for row, (key, _) in enumerate(items, start=start):
+                    self.rows[key] = row
+                self._count = start + len(items)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embedding function that remembers vectors by (model, text hash).
+
+    Lookups go to an in-memory LRU first, then to the memory-mapped
+    EmbeddingStore; only texts missing from both reach the wrapped model, in a
+    single batched call.
+    """
+
+    def __init__(self, embeddings, model_name, cache_dir=None, max_memory_entries=10000, max_disk_entries=100000):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_memory_entries = max_memory_entries
+        self.store = EmbeddingStore(cache_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', model_name),
+                                    max_entries=max_disk_entries) if cache_dir else None
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def key(self, text):
+        return hashlib.sha256(f'{self.model_name}\x00{text}'.encode('utf-8')).hexdigest()[:32]
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return vector
+        vector = self.store.get(key) if self.store is not None else None
+        if vector is not None:
+            self._remember(key, vector)
+            with self._lock:
+                self._stats['disk_hits'] += 1
+        return vector
+
+    def embed_documents(self, texts):
+        keys = [self.key(text) for text in texts]
+        vectors = [self._lookup(key) for key in keys]
+        # Positions of each uncached text, so repeated texts are embedded once
+        missing = OrderedDict()
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            with self._lock:
+                self._stats['misses'] += len(missing)
+            computed = self.embeddings.embed_documents([texts[positions[0]] for positions in missing.values()])
+            for (key, positions), vector in zip(missing.items(), computed):
+                for i in positions:
+                    vectors[i] = vector
+                self._remember(key, vector)
+            if self.store is not None:
+                self.store.put_many(zip(missing, computed))
+        return vectors
+
+    def embed_query(self, text):
+        key = self.key(text)
+        vector = self._lookup(key)
+        if vector is None:
+            with self._lock:
+                self._stats['misses'] += 1
+            vector = self.embeddings.embed_query(text)
+            self._remember(key, vector)
+            if self.store is not None:
+                self.store.put_many([(key, vector)])
+        return vector
+
+    def stats(self):
+        with self._lock:
+            hits = self._stats['memory_hits'] + self._stats['disk_hits']
+            lookups = hits + self._stats['misses']
+            return dict(
+                self._stats,
+                memory_entries=len(self._memory),
+                disk_entries=len(self.store) if self.store is not None else 0,
+                disk_compactions=self.store.compactions if self.store is not None else 0,
+                hit_ratio=round(hits / lookups, 4) if lookups else 0.0
+            )
@@ -0,0 +1,171 @@
+import hashlib
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionCancelled(Exception):
+    """Raised when an ingestion run is cancelled between batches"""
+
+
+class NoContentExtracted(ValueError):
+    """Raised when the input produced no chunks; nothing already stored is touched"""
+
+
+def chunk_id(text, source=None, row=None):
+    """Stable id for a chunk derived from its content, the source it came from and, for table rows, the row number.
+
+    The row number keeps identical rows of a table as separate records, so
+    counts and sums over them stay correct.
+    """
+    parts = [str(part) for part in (source, row) if part is not None]
+    payload = '\x1f'.join(parts + [text])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class IngestionPipeline:
+    """Split, embed and upsert documents into a Chroma collection.
+
+    Segments are ``(text, metadata)`` pairs consumed lazily; they are split into
+    overlapping chunks, grouped into batches, embedded on a bounded worker pool
+    and written to the collection with one ``upsert`` call per batch.
+
+    Chunk ids are derived from the source and the chunk text, so re-ingesting
+    a source only embeds chunks that changed: chunks it already has just get
+    their metadata refreshed, and chunks that are gone from it are deleted.
+    """
+
+    def __init__(self, embeddings, chunk_size=1000, chunk_overlap=150, batch_size=32, max_workers=4):
+        self._embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='embed')
+
+    @property
+    def embeddings(self):
+        """The embedding function; a callable passed in is resolved on first use"""
+        if callable(self._embeddings) and not hasattr(self._embeddings, 'embed_documents'):
+            self._embeddings = self._embeddings()
+        return self._embeddings
+
+    def split(self, segments):
+        """Yield chunk Documents for each (text, metadata) segment"""
+        for text, metadata in segments:
+            if not text or not text.strip():
+                continue
+            for chunk in self.splitter.split_text(text):
+                yield Document(page_content=chunk, metadata=dict(metadata), id=chunk_id(chunk, metadata.get('source'), metadata.get('row')))
+
+    def batches(self, documents, seen=None):
+        """Group chunk Documents into batches, dropping duplicate chunks (ids are collected in ``seen``)"""
+        seen = set() if seen is None else seen
+        batch = []
+        for doc in documents:
+            if doc.id in seen:
+                continue
+            seen.add(doc.id)
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def existing_ids(collection, source):
+        """Ids of the chunks a collection already holds for a source"""
+        ids = set()
+        offset = 0
+        while True:
+            page = collection.get(where={'source': source}, include=[], limit=1000, offset=offset)
+            if not page['ids']:
+                return ids
+            ids.update(page['ids'])
+            offset += len(page['ids'])
+
+    def _embed(self, batch):
+        start = time.perf_counter()
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in batch])
+        return batch, vectors, time.perf_counter() - start
+
+    def _upsert(self, collection, future, stats, on_progress):
+        batch, vectors, latency = future.result()
+        collection.upsert(
+            ids=[doc.id for doc in batch],
+            embeddings=vectors,
+            documents=[doc.page_content for doc in batch],
+            metadatas=[doc.metadata for doc in batch]
+        )
+        stats['chunks'] += len(batch)
+        stats['batches'] += 1
+        stats['embed_seconds'] += latency
+        stats['embed_max_seconds'] = max(stats['embed_max_seconds'], latency)
+        if on_progress is not None:
+            on_progress(stats['chunks'])
+
+    def run(self, collection, segments, on_progress=None, should_cancel=None, source=None):
+        """Ingest segments into a chromadb collection and return throughput stats.
+
+        ``on_progress(chunks)`` is called after every upserted batch and
+        ``should_cancel()`` is polled before each new batch is submitted. With
+        a ``source`` the run is incremental: unchanged chunks of that source
+        are not embedded again and chunks no longer produced are deleted.
+        Raises NoContentExtracted, before deleting anything, when the input
+        yields no chunks at all.
+        """
+        stats = {'chunks': 0, 'batches': 0, 'embed_seconds': 0.0, 'embed_max_seconds': 0.0, 'unchanged': 0, 'deleted': 0}
+        start = time.perf_counter()
+        known = self.existing_ids(collection, source) if source is not None else set()
+        seen = set()
+        pending = deque()
+        try:
+            for batch in self.batches(self.split(segments), seen):
+                if should_cancel is not None and should_cancel():
+                    raise IngestionCancelled()
+                unchanged = [doc for doc in batch if doc.id in known]
+                if unchanged:
+                    # Same source and text means the stored embedding is still valid
+                    collection.update(ids=[doc.id for doc in unchanged], metadatas=[doc.metadata for doc in unchanged])
+                    stats['unchanged'] += len(unchanged)
+                    batch = [doc for doc in batch if doc.id not in known]
+                    if not batch:
+                        continue
+                pending.append(self.executor.submit(self._embed, batch))
+                # Keep at most two batches per worker in flight so memory stays bounded
+                if len(pending) >= self.max_workers * 2:
+                    self._upsert(collection, pending.popleft(), stats, on_progress)
+            while pending:
+                self._upsert(collection, pending.popleft(), stats, on_progress)
+            # An empty (or unparseable) re-upload must not wipe the source it replaces
+            if not seen:
+                raise NoContentExtracted('No content extracted from input.')
+            stale = list(known - seen)
+            for offset in range(0, len(stale), 1000):
+                collection.delete(ids=stale[offset:offset + 1000])
+            stats['deleted'] = len(stale)
+        finally:
+            for future in pending:
+                future.cancel()
+
+        elapsed = time.perf_counter() - start
+        report = {
+            'chunks': stats['chunks'],
+            'batches': stats['batches'],
+            'unchanged': stats['unchanged'],
+            'deleted': stats['deleted'],
+            'elapsed_seconds': round(elapsed, 3),
+            'chunks_per_sec': round(stats['chunks'] / elapsed, 2) if elapsed > 0 else 0.0,
+            'embed_latency_ms_avg': round(1000 * stats['embed_seconds'] / stats['batches'], 2) if stats['batches'] else 0.0,
+            'embed_latency_ms_max': round(1000 * stats['embed_max_seconds'], 2)
+        }
+        logger.info(f"Ingested {report['chunks']} chunks ({report['unchanged']} unchanged, {report['deleted']} deleted) "
+                    f"in {report['elapsed_seconds']}s "
+                    f"({report['chunks_per_sec']} chunks/sec, avg embed {report['embed_latency_ms_avg']}ms/batch)")
+        return report
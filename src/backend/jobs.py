@@ -0,0 +1,134 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from ingestion import IngestionCancelled
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class IngestionJob:
+    """State and progress of one background ingestion"""
+
+    def __init__(self, source, collection_name):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.collection_name = collection_name
+        self.status = QUEUED
+        self.progress = {'pages_parsed': 0, 'chunks_embedded': 0}
+        self.errors = []
+        self.stats = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.cleanup = None
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'source': self.source,
+            'collection_name': self.collection_name,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'errors': list(self.errors),
+            'stats': self.stats,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class IngestionJobManager:
+    """Run ingestion jobs on a bounded thread pool and keep a short history of them"""
+
+    def __init__(self, max_concurrent_jobs=1, max_history=100):
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix='ingest')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, source, collection_name, work, cleanup=None):
+        """Queue ``work(job)`` and return the job; ``cleanup()`` always runs once the job ends"""
+        job = IngestionJob(source, collection_name)
+        job.cleanup = cleanup
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation; queued jobs stop immediately, running ones at the next batch"""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            # Never started, so _run will not get a chance to record the outcome or clean up
+            job.status = CANCELLED
+            job.finished_at = datetime.now()
+            self._cleanup(job)
+        return job
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def _prune(self):
+        # Drop the oldest finished jobs once the history is full
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_history:
+                break
+            if self._jobs[job_id].status in FINISHED_STATES:
+                del self._jobs[job_id]
+
+    @staticmethod
+    def _cleanup(job):
+        cleanup, job.cleanup = job.cleanup, None
+        if cleanup is not None:
+            try:
+                cleanup()
+            except Exception as e:
+                logger.error(f"Error cleaning up ingestion job {job.id}: {str(e)}")
+
+    def _run(self, job, work):
+        try:
+            if job.is_cancelled():
+                job.status = CANCELLED
+                return
+            job.status = RUNNING
+            job.started_at = datetime.now()
+            job.stats = work(job)
+            job.status = COMPLETED
+        except IngestionCancelled:
+            logger.info(f"Ingestion job {job.id} cancelled")
+            job.status = CANCELLED
+        except Exception as e:
+            logger.error(f"Ingestion job {job.id} failed: {str(e)}")
+            job.errors.append(str(e))
+            job.status = FAILED
+        finally:
+            job.finished_at = datetime.now()
+            self._cleanup(job)
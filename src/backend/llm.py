@@ -0,0 +1,55 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ChatModels:
+    """The shared OllamaLLM and RAG prompt chain, built on first use.
+
+    langchain_ollama is only imported when a model is first needed (a chat
+    request or the background warm-up), which keeps it out of process start.
+    """
+
+    def __init__(self, base_url, model_name, template, timeout=None):
+        self.base_url = base_url
+        self.model_name = model_name
+        self.template = template
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._model = None
+        self._prompt = None
+        self._chain = None
+
+    def _build(self):
+        with self._lock:
+            if self._chain is not None:
+                return
+            from langchain_core.prompts import ChatPromptTemplate
+            from langchain_ollama import OllamaLLM
+            logger.info(f"Initializing Ollama model '{self.model_name}'")
+            self._model = OllamaLLM(
+                base_url=self.base_url,
+                model=self.model_name,
+                client_kwargs={'timeout': self.timeout}
+            )
+            self._prompt = ChatPromptTemplate.from_template(self.template)
+            self._chain = self._prompt | self._model
+
+    @property
+    def model(self):
+        if self._chain is None:
+            self._build()
+        return self._model
+
+    @property
+    def prompt(self):
+        if self._chain is None:
+            self._build()
+        return self._prompt
+
+    @property
+    def chain(self):
+        if self._chain is None:
+            self._build()
+        return self._chain
@@ -1,34 +1,35 @@
 from dotenv import load_dotenv
-from langchain_ollama import OllamaLLM
-from langchain_core.prompts import ChatPromptTemplate
-from flask import Flask, request, jsonify, send_file, Response
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from http import HTTPStatus
 from functools import wraps
 import logging
 import os
+import json
+import hashlib
+import time
+import threading
 from datetime import datetime
-from collections import defaultdict
-from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
-from langchain_core.documents import Document
 import requests
-import mimetypes
+from requests.adapters import HTTPAdapter
 from werkzeug.utils import secure_filename
 import tempfile
-import PyPDF2
-import docx
-import speech_recognition as sr
-import pyttsx3
-import io
-import base64
-from pydub import AudioSegment
-from gtts import gTTS
 
-import os
-import io
-import pandas as pd
-import chromadb
+from vector_store import VectorStoreRegistry
+from ingestion import IngestionPipeline, chunk_id
+from jobs import IngestionJobManager
+from response_cache import ResponseCache
+from retrieval import HybridRetriever
+from memory import SessionMemory, MemorySummarizer
+from storage import create_store
+from llm import ChatModels
+from scheduler import GenerationScheduler, Overloaded
+from parsers import csv_rows, pdf_segments, docx_segments, url_segments
+from tables import TableCatalog, build_where, validate_filters
+from catalog import CollectionCatalog, CollectionExists, CollectionNotFound, valid_collection_name
+from tts import TextToSpeech, ClipCache, SpeechSynthesisError, create_engine as create_tts_engine
+from stt import SpeechToText, NoSpeechDetected, SpeechServiceError, create_engine as create_stt_engine
+from metrics import MetricsRegistry, ChatMetrics, OllamaUsageCallback, span, activate, current_trace, process_rss_bytes
 
 
 # Configure logging
@@ -54,6 +55,76 @@ app.config['BACKEND_SERVER_PORT'] = int (os.getenv('BACKEND_SERVER_PORT'))
 app.config['CHROMA_DB_PATH'] = os.getenv('CHROMA_DB_PATH')
 app.config['CHROMA_COLLECTION'] = os.getenv('CHROMA_COLLECTION')
 app.config['CHROMA_TELEMETRY_ANONYMIZED'] = os.getenv('CHROMA_TELEMETRY_ANONYMIZED')
+app.config['RAG_CHUNK_SIZE'] = int(os.getenv('RAG_CHUNK_SIZE', 1000))
+app.config['RAG_CHUNK_OVERLAP'] = int(os.getenv('RAG_CHUNK_OVERLAP', 150))
+app.config['RAG_EMBED_BATCH_SIZE'] = int(os.getenv('RAG_EMBED_BATCH_SIZE', 32))
+app.config['RAG_EMBED_WORKERS'] = int(os.getenv('RAG_EMBED_WORKERS', 4))
+app.config['RAG_MAX_CONCURRENT_JOBS'] = int(os.getenv('RAG_MAX_CONCURRENT_JOBS', 1))
+app.config['RAG_JOB_HISTORY'] = int(os.getenv('RAG_JOB_HISTORY', 100))
+app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 3600))
+app.config['SEMANTIC_CACHE_ENABLED'] = os.getenv('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+app.config['SEMANTIC_CACHE_THRESHOLD'] = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.95))
+app.config['SEMANTIC_CACHE_MAX_ENTRIES'] = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 500))
+app.config['MEMORY_TOKEN_BUDGET'] = int(os.getenv('MEMORY_TOKEN_BUDGET', 1500))
+app.config['MEMORY_WINDOW_TURNS'] = int(os.getenv('MEMORY_WINDOW_TURNS', 8))
+app.config['MEMORY_SUMMARY_ENABLED'] = os.getenv('MEMORY_SUMMARY_ENABLED', 'false').lower() == 'true'
+app.config['MEMORY_MAX_PENDING_TURNS'] = int(os.getenv('MEMORY_MAX_PENDING_TURNS', 16))
+app.config['CONTEXT_MAX_SESSIONS'] = int(os.getenv('CONTEXT_MAX_SESSIONS', 10000))
+app.config['CONTEXT_MAX_BYTES'] = int(os.getenv('CONTEXT_MAX_BYTES', 256 * 1024 * 1024))
+app.config['IDEMPOTENCY_TTL'] = int(os.getenv('IDEMPOTENCY_TTL', 86400))
+app.config['IDEMPOTENCY_MAX_ENTRIES'] = int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', 100000))
+app.config['IDEMPOTENCY_MAX_BYTES'] = int(os.getenv('IDEMPOTENCY_MAX_BYTES', 64 * 1024 * 1024))
+app.config['STORE_SWEEP_INTERVAL'] = int(os.getenv('STORE_SWEEP_INTERVAL', 30))
+app.config['SESSION_STORE_BACKEND'] = os.getenv('SESSION_STORE_BACKEND', 'memory')
+app.config['SESSION_STORE_SQLITE_PATH'] = os.getenv('SESSION_STORE_SQLITE_PATH', 'data1/sessions.db')
+app.config['SESSION_STORE_REDIS_URL'] = os.getenv('SESSION_STORE_REDIS_URL', 'redis://localhost:6379/0')
+app.config['SERVER_MODE'] = os.getenv('SERVER_MODE', 'wsgi')
+app.config['ASGI_MAX_CONCURRENCY'] = int(os.getenv('ASGI_MAX_CONCURRENCY', 256))
+app.config['ASGI_QUEUE_TIMEOUT'] = int(os.getenv('ASGI_QUEUE_TIMEOUT', 5))
+app.config['OLLAMA_TIMEOUT'] = float(os.getenv('OLLAMA_TIMEOUT', 300))
+app.config['OLLAMA_CONNECT_TIMEOUT'] = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', 5))
+app.config['OLLAMA_MAX_CONNECTIONS'] = int(os.getenv('OLLAMA_MAX_CONNECTIONS', 100))
+app.config['OLLAMA_MAX_KEEPALIVE'] = int(os.getenv('OLLAMA_MAX_KEEPALIVE', 20))
+app.config['HTTP_TIMEOUT'] = float(os.getenv('HTTP_TIMEOUT', 30))
+app.config['EMBEDDING_CACHE_ENABLED'] = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+app.config['EMBEDDING_CACHE_PATH'] = os.getenv('EMBEDDING_CACHE_PATH', 'data1/embedding_cache')
+app.config['EMBEDDING_CACHE_MEMORY_ENTRIES'] = int(os.getenv('EMBEDDING_CACHE_MEMORY_ENTRIES', 10000))
+app.config['EMBEDDING_CACHE_DISK_ENTRIES'] = int(os.getenv('EMBEDDING_CACHE_DISK_ENTRIES', 100000))
+app.config['RAG_TOP_K'] = int(os.getenv('RAG_TOP_K', 4))
+app.config['RAG_FETCH_K'] = int(os.getenv('RAG_FETCH_K', 20))
+app.config['RAG_SCORE_THRESHOLD'] = float(os.getenv('RAG_SCORE_THRESHOLD', 0.55))
+app.config['RAG_HYBRID_ENABLED'] = os.getenv('RAG_HYBRID_ENABLED', 'false').lower() == 'true'
+app.config['RAG_BM25_MIN_SCORE'] = float(os.getenv('RAG_BM25_MIN_SCORE', 1.0))
+app.config['METRICS_TRACE_HEADERS'] = os.getenv('METRICS_TRACE_HEADERS', 'false').lower() == 'true'
+app.config['OLLAMA_MAX_INFLIGHT'] = int(os.getenv('OLLAMA_MAX_INFLIGHT', 4))
+app.config['SCHEDULER_LATENCY_BUDGET'] = float(os.getenv('SCHEDULER_LATENCY_BUDGET', 10))
+app.config['SCHEDULER_SESSION_MAX_QUEUED'] = int(os.getenv('SCHEDULER_SESSION_MAX_QUEUED', 2))
+app.config['EMBED_BATCH_WINDOW_MS'] = float(os.getenv('EMBED_BATCH_WINDOW_MS', 5))
+app.config['EMBED_BATCH_MAX'] = int(os.getenv('EMBED_BATCH_MAX', 64))
+app.config['RAG_CSV_CHUNK_ROWS'] = int(os.getenv('RAG_CSV_CHUNK_ROWS', 1000))
+app.config['RAG_SEGMENT_CHARS'] = int(os.getenv('RAG_SEGMENT_CHARS', 8000))
+app.config['RAG_MAX_URL_BYTES'] = int(os.getenv('RAG_MAX_URL_BYTES', 20 * 1024 * 1024))
+app.config['RAG_FILTERED_TOP_K'] = int(os.getenv('RAG_FILTERED_TOP_K', 20))
+app.config['RAG_QUESTION_FILTERS'] = os.getenv('RAG_QUESTION_FILTERS', 'true').lower() == 'true'
+app.config['TABLE_COLUMNAR_CACHE'] = os.getenv('TABLE_COLUMNAR_CACHE', 'false').lower() == 'true'
+app.config['STARTUP_MODE'] = os.getenv('STARTUP_MODE', 'lazy')
+app.config['WARMUP_RETRY_INTERVAL'] = float(os.getenv('WARMUP_RETRY_INTERVAL', 5))
+app.config['COLLECTION_CATALOG_TTL'] = float(os.getenv('COLLECTION_CATALOG_TTL', 30))
+app.config['STT_BACKEND'] = os.getenv('STT_BACKEND', 'google')
+app.config['STT_MODEL'] = os.getenv('STT_MODEL', 'base.en')
+app.config['STT_COMPUTE_TYPE'] = os.getenv('STT_COMPUTE_TYPE', 'int8')
+app.config['STT_MODEL_PATH'] = os.getenv('STT_MODEL_PATH', 'data1/whisper') or None
+app.config['STT_WORKERS'] = int(os.getenv('STT_WORKERS', 2))
+app.config['STT_CPU_THREADS'] = int(os.getenv('STT_CPU_THREADS', 0))
+app.config['STT_CHUNK_SECONDS'] = float(os.getenv('STT_CHUNK_SECONDS', 30))
+app.config['TTS_BACKEND'] = os.getenv('TTS_BACKEND', 'gtts')
+app.config['TTS_VOICE'] = os.getenv('TTS_VOICE', 'en')
+app.config['TTS_RATE'] = int(os.getenv('TTS_RATE', 170))
+app.config['TTS_ESPEAK_BINARY'] = os.getenv('TTS_ESPEAK_BINARY', 'espeak')
+app.config['TTS_WORKERS'] = int(os.getenv('TTS_WORKERS', 2))
+app.config['TTS_CACHE_MAX_ENTRIES'] = int(os.getenv('TTS_CACHE_MAX_ENTRIES', 2000))
+app.config['TTS_CACHE_MAX_BYTES'] = int(os.getenv('TTS_CACHE_MAX_BYTES', 64 * 1024 * 1024))
 
 # Initialize Ollama
 template = """
@@ -63,18 +134,275 @@ Question: {question}
 Context: {context}
 Answer: 
 """
-model = OllamaLLM(base_url=app.config['OLLAMA_BASE_URL'], model=app.config['OLLAMA_MODEL'])
-prompt = ChatPromptTemplate.from_template(template)
-chain = prompt | model
+# Built on first use (or by the warm-up) so importing this module stays fast
+chat_models = ChatModels(
+    base_url=app.config['OLLAMA_BASE_URL'],
+    model_name=app.config['OLLAMA_MODEL'],
+    template=template,
+    timeout=app.config['OLLAMA_TIMEOUT']
+)
+
+# Shared HTTP session so outbound fetches reuse pooled keep-alive connections
+http_session = requests.Session()
+http_session.mount('http://', HTTPAdapter(pool_maxsize=app.config['OLLAMA_MAX_KEEPALIVE']))
+http_session.mount('https://', HTTPAdapter(pool_maxsize=app.config['OLLAMA_MAX_KEEPALIVE']))
+
+# Shared Chroma client, embeddings and per-collection vector stores
+vector_stores = VectorStoreRegistry(
+    db_path=app.config['CHROMA_DB_PATH'],
+    ollama_base_url=app.config['OLLAMA_BASE_URL'],
+    embedding_model=app.config['OLLAMA_EMBEDDING_MODEL'],
+    embedding_cache_dir=app.config['EMBEDDING_CACHE_PATH'] if app.config['EMBEDDING_CACHE_ENABLED'] else None,
+    embedding_cache_entries=app.config['EMBEDDING_CACHE_MEMORY_ENTRIES'],
+    embedding_cache_disk_entries=app.config['EMBEDDING_CACHE_DISK_ENTRIES'],
+    embed_batch_window=app.config['EMBED_BATCH_WINDOW_MS'] / 1000,
+    embed_batch_max=app.config['EMBED_BATCH_MAX'],
+    timeout=app.config['OLLAMA_TIMEOUT']
+)
+
+# Score-gated (optionally hybrid vector + BM25) retrieval for chat
+retriever = HybridRetriever(
+    vector_stores,
+    top_k=app.config['RAG_TOP_K'],
+    fetch_k=app.config['RAG_FETCH_K'],
+    score_threshold=app.config['RAG_SCORE_THRESHOLD'],
+    hybrid_enabled=app.config['RAG_HYBRID_ENABLED'],
+    bm25_min_score=app.config['RAG_BM25_MIN_SCORE'],
+    filtered_top_k=app.config['RAG_FILTERED_TOP_K']
+)
+
+# Schema and optional columnar copy of CSV rows, for where filters and aggregates
+table_catalog = TableCatalog(vector_stores, columnar=app.config['TABLE_COLUMNAR_CACHE'])
+
+# Record counts of every collection, so chat skips retrieval on empty or missing ones
+collection_catalog = CollectionCatalog(vector_stores, ttl=app.config['COLLECTION_CATALOG_TTL'])
+
+# Chunking/embedding pipeline used by /api/v1/rag; the embeddings are resolved on the first ingestion
+ingestion_pipeline = IngestionPipeline(
+    lambda: vector_stores.embeddings,
+    chunk_size=app.config['RAG_CHUNK_SIZE'],
+    chunk_overlap=app.config['RAG_CHUNK_OVERLAP'],
+    batch_size=app.config['RAG_EMBED_BATCH_SIZE'],
+    max_workers=app.config['RAG_EMBED_WORKERS']
+)
+
+# Background ingestion jobs, capped so uploads cannot starve chat traffic
+ingestion_jobs = IngestionJobManager(
+    max_concurrent_jobs=app.config['RAG_MAX_CONCURRENT_JOBS'],
+    max_history=app.config['RAG_JOB_HISTORY']
+)
+
+# Exact and semantic cache of LLM answers
+response_cache = ResponseCache(
+    max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+    ttl=app.config['RESPONSE_CACHE_TTL'],
+    semantic_enabled=app.config['SEMANTIC_CACHE_ENABLED'],
+    semantic_threshold=app.config['SEMANTIC_CACHE_THRESHOLD'],
+    semantic_max_entries=app.config['SEMANTIC_CACHE_MAX_ENTRIES']
+)
+
+# Admission control in front of the chat model: capped in-flight generations,
+# fair per-session queueing and fast 429/503 rejections past the latency budget
+generation_scheduler = GenerationScheduler(
+    app.config['OLLAMA_MODEL'],
+    max_inflight=app.config['OLLAMA_MAX_INFLIGHT'],
+    latency_budget=app.config['SCHEDULER_LATENCY_BUDGET'],
+    session_max_queued=app.config['SCHEDULER_SESSION_MAX_QUEUED']
+)
+
+# Speech-to-text: Google Web Speech or an offline faster-whisper model shared by a worker pool
+speech_to_text_service = SpeechToText(
+    create_stt_engine(
+        app.config['STT_BACKEND'],
+        **({
+            'model_size': app.config['STT_MODEL'],
+            'compute_type': app.config['STT_COMPUTE_TYPE'],
+            'num_workers': app.config['STT_WORKERS'],
+            'cpu_threads': app.config['STT_CPU_THREADS'],
+            'download_root': app.config['STT_MODEL_PATH']
+        } if app.config['STT_BACKEND'] == 'whisper' else {})
+    ),
+    max_workers=app.config['STT_WORKERS'],
+    chunk_seconds=app.config['STT_CHUNK_SECONDS']
+)
+
+# Text-to-speech: sentence-by-sentence synthesis (espeak offline, or gTTS) with an LRU clip cache
+text_to_speech_service = TextToSpeech(
+    create_tts_engine(
+        app.config['TTS_BACKEND'],
+        **({
+            'binary': app.config['TTS_ESPEAK_BINARY'],
+            'voice': app.config['TTS_VOICE'],
+            'rate': app.config['TTS_RATE']
+        } if app.config['TTS_BACKEND'] == 'espeak' else {'lang': app.config['TTS_VOICE']})
+    ),
+    ClipCache(max_entries=app.config['TTS_CACHE_MAX_ENTRIES'], max_bytes=app.config['TTS_CACHE_MAX_BYTES']),
+    max_workers=app.config['TTS_WORKERS']
+)
+
+# Storage for session context and idempotency records (memory, sqlite or redis).
+# Context expires CONTEXT_EXPIRY seconds after the last turn.
+session_store = create_store(
+    app.config['SESSION_STORE_BACKEND'],
+    namespaces={
+        'context': {
+            'ttl': app.config['CONTEXT_EXPIRY'],
+            'max_entries': app.config['CONTEXT_MAX_SESSIONS'],
+            'max_bytes': app.config['CONTEXT_MAX_BYTES']
+        },
+        'idempotency': {
+            'ttl': app.config['IDEMPOTENCY_TTL'],
+            'max_entries': app.config['IDEMPOTENCY_MAX_ENTRIES'],
+            'max_bytes': app.config['IDEMPOTENCY_MAX_BYTES']
+        }
+    },
+    sqlite_path=app.config['SESSION_STORE_SQLITE_PATH'],
+    redis_url=app.config['SESSION_STORE_REDIS_URL'],
+    sweep_interval=app.config['STORE_SWEEP_INTERVAL']
+)
+
+# Prometheus metrics served on /api/v1/metrics
+metrics_registry = MetricsRegistry()
+chat_metrics = ChatMetrics(metrics_registry)
+llm_usage = OllamaUsageCallback(chat_metrics)
+cache_hit_ratio = metrics_registry.gauge('cache_hit_ratio', 'Hit ratio of the in-process caches', ('cache',))
+cache_entries = metrics_registry.gauge('cache_entries', 'Entries held by the in-process caches', ('cache',))
+vector_store_lookups = metrics_registry.gauge('vector_store_lookups', 'Vector store registry lookups by cache state', ('state',))
+session_store_entries = metrics_registry.gauge('session_store_entries', 'Live session store records', ('namespace',))
+scheduler_inflight = metrics_registry.gauge('scheduler_inflight_generations', 'Generations currently holding a model slot', ('model',))
+scheduler_queued = metrics_registry.gauge('scheduler_queued_requests', 'Requests waiting for a model slot', ('model',))
+scheduler_rejections = metrics_registry.counter('scheduler_rejections_total', 'Requests shed by admission control', ('model', 'reason'))
+embedding_batch_size = metrics_registry.gauge('embedding_batch_size_avg', 'Average number of queries per batched embedding call')
+process_memory = metrics_registry.gauge('process_resident_memory_bytes', 'Resident memory size of the backend process')
+
+@metrics_registry.collector
+def collect_component_stats():
+    """Mirror the caches' and stores' own counters into gauges at scrape time"""
+    cache_stats = response_cache.stats()
+    cache_hit_ratio.set(cache_stats['hit_ratio'], cache='response')
+    cache_entries.set(cache_stats['exact_entries'], cache='response')
+    cache_entries.set(cache_stats['semantic_entries'], cache='response_semantic')
 
-# In-memory storage for context
-context_store = defaultdict(lambda: {
-    'context': '',
-    'last_updated': datetime.now()
-})
+    store_stats = vector_stores.stats()
+    vector_store_lookups.set(store_stats['warm_hits'], state='warm')
+    vector_store_lookups.set(store_stats['cold_hits'], state='cold')
+    if store_stats['embedding_cache']:
+        cache_hit_ratio.set(store_stats['embedding_cache']['hit_ratio'], cache='embedding')
+        cache_entries.set(store_stats['embedding_cache']['memory_entries'], cache='embedding')
 
-# In-memory storage for idempotency
-idempotency_cache = {}
+    if store_stats['embedding_batches']:
+        embedding_batch_size.set(store_stats['embedding_batches']['avg_batch_size'])
+
+    scheduler_stats = generation_scheduler.stats()
+    scheduler_inflight.set(scheduler_stats['inflight'], model=scheduler_stats['model'])
+    scheduler_queued.set(scheduler_stats['queued'], model=scheduler_stats['model'])
+    scheduler_rejections.set_total(scheduler_stats['rejected_session'], model=scheduler_stats['model'], reason='session')
+    scheduler_rejections.set_total(scheduler_stats['rejected_overload'], model=scheduler_stats['model'], reason='overload')
+    scheduler_rejections.set_total(scheduler_stats['timed_out'], model=scheduler_stats['model'], reason='timeout')
+
+    for namespace, value in session_store.stats().items():
+        if isinstance(value, dict):
+            session_store_entries.set(value.get('entries', 0), namespace=namespace)
+    process_memory.set(process_rss_bytes())
+
+def context_key(session_id):
+    return f'context:{session_id}'
+
+def idempotency_record_key(idempotency_key):
+    return f'idempotency:{idempotency_key}'
+
+def context_record(memory):
+    """Serializable session context entry"""
+    return {
+        'memory': memory.to_dict(),
+        'last_updated': datetime.now().isoformat()
+    }
+
+def load_session_memory(session_id):
+    """Return the stored memory for a session, or None"""
+    entry = session_store.get(context_key(session_id))
+    return SessionMemory.from_dict(entry['memory']) if entry else None
+
+def save_session_memory(session_id, memory):
+    """Store the memory for a session"""
+    session_store.set(context_key(session_id), context_record(memory))
+
+def summarize_invoke(text):
+    """Summaries queue for the model like a session of their own"""
+    with generation_scheduler.slot('memory-summarizer'):
+        return chat_models.model.invoke(text)
+
+# Rolling summaries of turns that slid out of a session's window
+memory_summarizer = MemorySummarizer(
+    summarize_invoke, load_session_memory, save_session_memory, max_turns=app.config['MEMORY_MAX_PENDING_TURNS']
+) if app.config['MEMORY_SUMMARY_ENABLED'] else None
+
+# Background warm-up; the service is live as soon as it listens and ready once this completes
+warmup_state = {'state': 'pending', 'started_at': None, 'ready_at': None, 'steps': {}, 'attempts': 0, 'error': None}
+warmup_lock = threading.Lock()
+
+def warmup_steps():
+    """(name, callable) pairs that load what the first chat request would otherwise pay for"""
+    steps = [
+        ('model', lambda: chat_models.chain),
+        # A generate call without a prompt makes Ollama load the model weights
+        ('model_load', lambda: http_session.post(
+            f"{app.config['OLLAMA_BASE_URL']}/api/generate",
+            json={'model': app.config['OLLAMA_MODEL']},
+            timeout=app.config['OLLAMA_TIMEOUT']
+        ).raise_for_status())
+    ]
+    # Only touch Chroma when a database exists; opening the client would create one
+    if os.path.exists(app.config['CHROMA_DB_PATH']):
+        steps.append(('collections', collection_catalog.load))
+    if os.path.exists(app.config['CHROMA_DB_PATH']) or response_cache.semantic_enabled:
+        steps.append(('embeddings', lambda: vector_stores.embeddings.embed_query('warm-up')))
+    if app.config['STT_BACKEND'] == 'whisper':
+        steps.append(('speech_to_text', speech_to_text_service.engine.load))
+    return steps
+
+def warm_up():
+    """Run the warm-up steps, retrying failed ones until they all succeed"""
+    warmup_state.update(state='warming', started_at=datetime.now().isoformat())
+    pending = warmup_steps()
+    while pending:
+        warmup_state['attempts'] += 1
+        failed = []
+        for name, step in pending:
+            start = time.perf_counter()
+            try:
+                step()
+                warmup_state['steps'][name] = round(time.perf_counter() - start, 3)
+            except Exception as e:
+                logger.warning(f"Warm-up step '{name}' failed: {str(e)}")
+                warmup_state['error'] = f'{name}: {str(e)}'
+                failed.append((name, step))
+        pending = failed
+        if pending:
+            time.sleep(app.config['WARMUP_RETRY_INTERVAL'])
+    warmup_state.update(state='ready', ready_at=datetime.now().isoformat(), error=None)
+    logger.info(f"Warm-up complete: {warmup_state['steps']}")
+
+def warmup_report():
+    """Snapshot of the warm-up state that is safe to serialize while the warm-up runs"""
+    return dict(warmup_state, steps=dict(warmup_state['steps']))
+
+def start_warmup():
+    """Start the warm-up once per process: in the background, or inline with STARTUP_MODE=eager"""
+    with warmup_lock:
+        if warmup_state['state'] != 'pending':
+            return
+        warmup_state['state'] = 'starting'
+    if app.config['STARTUP_MODE'] == 'eager':
+        warm_up()
+    else:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+@app.before_request
+def ensure_warmup():
+    # Covers servers that import the app without going through __main__
+    if warmup_state['state'] == 'pending':
+        start_warmup()
 
 def validate_json(f):
     @wraps(f)
@@ -87,6 +415,47 @@ def validate_json(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def trace_request(endpoint):
+    """Collect per-stage timings for a chat request and publish them when it finishes.
+
+    An incoming ``X-Trace-ID`` is reused. With METRICS_TRACE_HEADERS enabled the
+    trace id, and for non-streamed responses a Server-Timing breakdown, are
+    returned in the response headers. Streamed responses are finished once the
+    stream is closed.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            trace = chat_metrics.start(endpoint, request.headers.get('X-Trace-ID'))
+            streamed = False
+            try:
+                with activate(trace):
+                    response = app.make_response(f(*args, **kwargs))
+                streamed = response.is_streamed
+                if streamed:
+                    response.call_on_close(lambda: chat_metrics.finish(trace))
+                if app.config['METRICS_TRACE_HEADERS']:
+                    response.headers['X-Trace-ID'] = trace.trace_id
+                    if not streamed:
+                        response.headers['Server-Timing'] = trace.server_timing()
+                return response
+            finally:
+                if not streamed:
+                    chat_metrics.finish(trace)
+        return decorated_function
+    return decorator
+
+def overloaded_response(error):
+    """429/503 response telling the client when to retry"""
+    response = jsonify({
+        'status': 'error',
+        'message': str(error),
+        'retry_after': error.retry_after
+    })
+    response.status_code = error.status
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 def log_request(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -104,184 +473,340 @@ def get_session_id():
         session_id = request.remote_addr
     return session_id
 
-def is_context_expired(session_id):
-    """Check if the context for a session has expired"""
-    if session_id not in context_store:
-        return True
-    
-    last_updated = context_store[session_id]['last_updated']
-    expiry_time = datetime.now() - last_updated
-    return expiry_time.total_seconds() > app.config['CONTEXT_EXPIRY']
-
 def get_idempotency_key():
     """Get idempotency key from request headers"""
     return request.headers.get('X-Idempotency-Key')
 
-def is_idempotent_request(idempotency_key):
-    """Check if this is a duplicate request based on idempotency key"""
-    return idempotency_key in idempotency_cache
+def idempotency_record(response_data, status_code):
+    """Serializable idempotency entry"""
+    return {
+        'response': response_data,
+        'status_code': int(status_code),
+        'timestamp': datetime.now().isoformat()
+    }
 
 def cache_response(idempotency_key, response_data, status_code):
     """Cache the response for idempotency"""
-    idempotency_cache[idempotency_key] = {
-        'response': response_data,
-        'status_code': status_code,
-        'timestamp': datetime.now()
+    session_store.set(idempotency_record_key(idempotency_key), idempotency_record(response_data, status_code))
+
+def table_filters(question, collection_name, filters=None):
+    """Metadata filters for a question: the request's own, plus column values the question mentions"""
+    found = {}
+    if app.config['RAG_QUESTION_FILTERS']:
+        with span('relevance_check'):
+            found = table_catalog.filters_from_question(collection_name, question)
+    # Explicit request filters win over ones guessed from the question
+    return dict(found, **(filters or {}))
+
+def retrieve_documents(question, collection_name, filters=None):
+    """Embed the question once and fetch the relevant top-k chunks from a collection.
+
+    Chunks below the similarity (and, in hybrid mode, BM25) thresholds are
+    already dropped, so an empty list means the collection is not relevant.
+    With metadata filters only matching records (e.g. CSV rows) are searched,
+    and with the columnar table cache enabled, aggregates the question asks
+    for are computed directly. Filters the request passed bypass the
+    similarity threshold; ones guessed from the question do not, and their
+    aggregates are only used when some matching record was relevant.
+    Returns ``(question_vector, documents, facts, filters)``.
+    """
+    explicit = bool(filters)
+    filters = table_filters(question, collection_name, filters)
+    with span('query_embedding'):
+        question_vector = vector_stores.embeddings.embed_query(question)
+    documents = retriever.retrieve(question, question_vector, collection_name, where=build_where(filters), gated=not explicit)
+    facts = None
+    if explicit or documents:
+        with span('relevance_check'):
+            facts = table_catalog.aggregate(collection_name, question, filters)
+    if filters:
+        logger.info(f"Filtered retrieval on {filters}: {len(documents)} records")
+    return question_vector, documents, facts, filters
+
+def format_documents(documents, facts=None):
+    """Join retrieved chunks, and any computed table facts, into the prompt's summary section"""
+    sections = [f'Computed from the table:\n{facts}'] if facts else []
+    sections.extend(doc.page_content for doc in documents)
+    return '\n\n'.join(sections)
+
+def plan_chat(question, memory, collection_name=None, filters=None):
+    """Pick the scenario for a question and build everything the model needs to answer it.
+
+    Returns a dict holding the runnable (the bare model or the RAG chain) and its
+    input, the retrieved documents, and the values the response cache is keyed
+    on. Shared by /api/v1/chat and /api/v1/chat/stream.
+    """
+    context = memory.build_context(app.config['MEMORY_TOKEN_BUDGET'])
+
+    # Retrieval is skipped outright when the collection is missing or empty
+    chroma_collection = collection_name or app.config['CHROMA_COLLECTION']
+    rag_data_available = bool(chroma_collection) and bool(collection_catalog.size(chroma_collection))
+
+    plan = {
+        'question': question,
+        'scenario': 'basic',
+        'runnable': chat_models.model,
+        'inputs': question,
+        'prompt_text': question,
+        'collection': None,
+        'documents': [],
+        'filters': {},
+        'question_vector': None
+    }
+
+    # Determine which approach to use based on available data
+    if not context and not rag_data_available:
+        # Scenario 1: No context and no RAG data - use basic chain
+        logger.info("Using basic chain - no context, no RAG data")
+        if response_cache.semantic_enabled:
+            with span('query_embedding'):
+                plan['question_vector'] = vector_stores.embeddings.embed_query(question)
+
+    elif context and not rag_data_available:
+        # Scenario 2: Has context but no RAG data - use context with chain
+        logger.info("Using context with chain - no RAG data")
+        full_query = f"{context}\n\n{question}"
+        plan.update(scenario='context', inputs=full_query, prompt_text=full_query)
+
+    elif not context and rag_data_available:
+        # Scenario 3: No context but has RAG data - use RAG search
+        logger.info("Using RAG search - no context")
+        question_vector, summary, facts, applied = retrieve_documents(question, chroma_collection, filters)
+        # The semantic tier only compares questions, so answers to filtered questions are matched exactly
+        plan.update(scenario='rag', collection=chroma_collection, filters=applied,
+                    question_vector=None if applied else question_vector)
+
+        if summary or facts:
+            logger.info("RAG data is relevant - using RAG search")
+            plan.update(runnable=chat_models.chain, documents=summary, inputs={
+                "summary": format_documents(summary, facts),
+                "question": question,
+                "context": ""
+            })
+        else:
+            logger.info("RAG data not relevant or empty - using basic model")
+
+    else:
+        # Scenario 4: Has both context and RAG data - use RAG as additional search data
+        logger.info("Using RAG search with context")
+        _, summary, facts, applied = retrieve_documents(question, chroma_collection, filters)
+        full_query = f"{context}\n\n{question}"
+        plan.update(scenario='rag_context', collection=chroma_collection, filters=applied,
+                    inputs=full_query, prompt_text=full_query)
+
+        if summary or facts:
+            logger.info("RAG data is relevant - using RAG search with context")
+            plan.update(runnable=chat_models.chain, documents=summary, inputs={
+                "summary": format_documents(summary, facts),
+                "question": question,
+                "context": context
+            })
+        else:
+            # No relevant RAG data found, use context only
+            logger.info("RAG data not relevant or empty - using context only")
+
+    trace = current_trace()
+    if trace is not None:
+        trace.scenario = plan['scenario']
+    return plan
+
+def plan_prompt(plan):
+    """The exact prompt string the plan's runnable sends to Ollama"""
+    if plan['runnable'] is chat_models.chain:
+        return chat_models.prompt.invoke(plan['inputs']).to_string()
+    return plan['inputs']
+
+def lookup_answer(plan):
+    """Return ``(answer, tier, key)`` from the response cache; answer is None on a miss.
+
+    The semantic tier is only used when the plan carries a question vector,
+    i.e. when the answer depends neither on session context nor on metadata
+    filters; the filters are part of the exact key.
+    """
+    model_name = app.config['OLLAMA_MODEL']
+    doc_ids = [doc.id or chunk_id(doc.page_content) for doc in plan['documents']]
+    key = response_cache.exact_key(model_name, plan['prompt_text'], doc_ids, plan['filters'])
+    answer, tier = response_cache.lookup(key, model_name, plan['collection'], plan['question_vector'])
+    if answer is not None:
+        logger.info(f"Response cache {tier} hit")
+    return answer, tier, key
+
+def store_answer(plan, key, answer):
+    """Remember a freshly generated answer in the response cache"""
+    if answer:
+        response_cache.put(key, answer, app.config['OLLAMA_MODEL'], plan['collection'], plan['question_vector'])
+
+def stream_answer(plan):
+    """Yield the plan's answer chunk by chunk, timing time-to-first-token and total generation"""
+    trace = current_trace()
+    start = time.perf_counter()
+    stream = plan['runnable'].stream(plan['inputs'], config={'callbacks': [llm_usage]})
+    first = True
+    try:
+        for chunk in stream:
+            if first and trace is not None:
+                trace.record('llm_ttft', time.perf_counter() - start)
+            first = False
+            yield chunk
+    finally:
+        # Closing the model stream drops the connection to Ollama, which stops generation
+        stream.close()
+        if trace is not None:
+            trace.record('llm_total', time.perf_counter() - start)
+
+def cached_invoke(plan, session_id):
+    """Answer a plan from the response cache, invoking the model only on a miss.
+
+    Misses wait for a slot from the generation scheduler, which raises
+    Overloaded instead of queueing past its latency budget.
+    """
+    answer, _, key = lookup_answer(plan)
+    if answer is None:
+        with span('queue_wait'):
+            ticket = generation_scheduler.acquire(session_id)
+        try:
+            answer = ''.join(stream_answer(plan))
+        finally:
+            ticket.release()
+        store_answer(plan, key, answer)
+    return answer
+
+def finish_chat(session_id, memory, question, answer, idempotency_key=None):
+    """Record a turn in the session memory, persist it and return the response payload"""
+    # Append new Q&A to the session memory
+    summarize = memory.add_turn(question, answer, app.config['MEMORY_WINDOW_TURNS'],
+                                max_pending=app.config['MEMORY_MAX_PENDING_TURNS']) > 0
+    if summarize and memory_summarizer is None:
+        memory.drop_pending()
+
+    response_data = {
+        'status': 'success',
+        'data': {
+            'question': question,
+            'answer': answer,
+            'timestamp': datetime.now().isoformat(),
+            'session_id': session_id
+        }
     }
 
-def cleanup_old_cache():
-    """Clean up old cached responses (older than 24 hours)"""
-    current_time = datetime.now()
-    keys_to_remove = []
-    for key, value in idempotency_cache.items():
-        if (current_time - value['timestamp']).total_seconds() > 86400:  # 24 hours
-            keys_to_remove.append(key)
-    
-    for key in keys_to_remove:
-        del idempotency_cache[key]
-
-def is_rag_relevant(question, summary):
-    """Check if RAG data is relevant to the question"""
-    if not summary:
-        return False
-    
-    # Convert question and summary to lowercase for comparison
-    question_lower = question.lower()
-    summary_text = str(summary).lower()
-    
-    # Extract key words from question (simple approach)
-    question_words = set(word for word in question_lower.split() if len(word) > 3)
-    
-    # Check if any key words from question appear in summary
-    relevant_words = [word for word in question_words if word in summary_text]
-    
-    # Consider relevant if at least 1 key word matches
-    return len(relevant_words) > 0
+    # Store the context, and the response if idempotency key is provided, in one write
+    writes = {context_key(session_id): context_record(memory)}
+    if idempotency_key:
+        writes[idempotency_record_key(idempotency_key)] = idempotency_record(response_data, HTTPStatus.OK)
+    session_store.set_many(writes)
+
+    if summarize and memory_summarizer is not None:
+        memory_summarizer.submit(session_id)
+    return response_data
+
+def document_sources(documents):
+    """Identify the retrieved documents for clients"""
+    return [{'id': doc.id, **doc.metadata} for doc in documents]
+
+def sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def replay_events(record):
+    """SSE events replaying a stored idempotent chat response: the final answer as one token, then done"""
+    data = record['response']['data']
+    yield sse_event('sources', {'scenario': 'replay', 'documents': []})
+    yield sse_event('token', {'token': data['answer']})
+    yield sse_event('done', {
+        'session_id': data['session_id'],
+        'cache': 'idempotent',
+        'chunks': 1,
+        'time_to_first_token_ms': None,
+        'total_ms': 0.0,
+        'timestamp': data['timestamp']
+    })
 
 @app.route('/api/v1/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint.
+
+    ``?probe=live`` answers 200 as long as the process serves requests;
+    ``?probe=ready`` answers 503 until the warm-up has finished. Without a
+    probe the full report is returned.
+    """
+    probe = request.args.get('probe')
+    ready = warmup_state['state'] == 'ready'
+    if probe == 'live':
+        return jsonify({'status': 'success', 'live': True}), HTTPStatus.OK
+    if probe == 'ready':
+        return jsonify({
+            'status': 'success' if ready else 'error',
+            'ready': ready,
+            'warmup': warmup_report()
+        }), HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE
     return jsonify({
         'status': 'success',
         'message': 'Service is healthy',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'live': True,
+        'ready': ready,
+        'warmup': warmup_report(),
+        'vector_store': vector_stores.stats(),
+        'ingestion_jobs': ingestion_jobs.stats(),
+        'response_cache': response_cache.stats(),
+        'session_store': session_store.stats(),
+        'scheduler': generation_scheduler.stats(),
+        'speech_to_text': speech_to_text_service.stats(),
+        'text_to_speech': text_to_speech_service.stats()
     }), HTTPStatus.OK
 
+@app.route('/api/v1/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/v1/chat', methods=['POST'])
 @validate_json
 @log_request
+@trace_request('chat')
 def chat():
     try:
-        # Check for idempotency
         idempotency_key = get_idempotency_key()
-        if idempotency_key and is_idempotent_request(idempotency_key):
-            # Return cached response
-            cached_data = idempotency_cache[idempotency_key]
-            return jsonify(cached_data['response']), cached_data['status_code']
-        
-        # Clean up old cache entries
-        cleanup_old_cache()
-        
         data = request.get_json()
         session_id = get_session_id()
         question = data.get("question", "")
         collection_name = data.get("collection_name")
+        filters = data.get("filters")
+        if filters is not None:
+            try:
+                validate_filters(filters)
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.BAD_REQUEST
+
+        # Read the idempotency record and the session context in one round trip
+        keys = [context_key(session_id)]
+        if idempotency_key:
+            keys.append(idempotency_record_key(idempotency_key))
+        records = session_store.get_many(keys)
+
+        # Check for idempotency
+        cached_data = records.get(idempotency_record_key(idempotency_key)) if idempotency_key else None
+        if cached_data:
+            # Return cached response
+            return jsonify(cached_data['response']), cached_data['status_code']
 
         # Retrieve previous context or start fresh
-        context = context_store[session_id]['context'] if session_id in context_store else ""
-        
-        # Check if RAG/Chroma DB exists
-        rag_data_available = os.path.exists(app.config['CHROMA_DB_PATH'])
-        
-        # Determine which approach to use based on available data
-        if not context and not rag_data_available:
-            # Scenario 1: No context and no RAG data - use basic chain
-            logger.info("Using basic chain - no context, no RAG data")
-            result = model.invoke(question)
-            
-        elif context and not rag_data_available:
-            # Scenario 2: Has context but no RAG data - use context with chain
-            logger.info("Using context with chain - no RAG data")
-            full_query = f"{context}\n\n{question}"
-            result = model.invoke(full_query)
-            
-        elif not context and rag_data_available:
-            # Scenario 3: No context but has RAG data - use RAG search
-            logger.info("Using RAG search - no context")
-            client = chromadb.PersistentClient(path=app.config['CHROMA_DB_PATH'])
-            embedding_fn = OllamaEmbeddings(base_url=app.config['OLLAMA_BASE_URL'], model=app.config['OLLAMA_EMBEDDING_MODEL'])
-            chroma_collection = collection_name if collection_name else app.config['CHROMA_COLLECTION']
-            vector_store = Chroma(
-                client=client,
-                collection_name=chroma_collection,
-                embedding_function=embedding_fn
-            )
-            retriever = vector_store.as_retriever()
-            summary = retriever.invoke(question)
-            
-            if summary and is_rag_relevant(question, summary):
-                logger.info("RAG data is relevant - using RAG search")
-                result = chain.invoke({
-                    "summary": str(summary), 
-                    "question": question, 
-                    "context": ""
-                })
-            else:
-                logger.info("RAG data not relevant or empty - using basic model")
-                result = model.invoke(question)
-                
-        else:
-            # Scenario 4: Has both context and RAG data - use RAG as additional search data
-            logger.info("Using RAG search with context")
-            client = chromadb.PersistentClient(path=app.config['CHROMA_DB_PATH'])
-            embedding_fn = OllamaEmbeddings(base_url=app.config['OLLAMA_BASE_URL'], model=app.config['OLLAMA_EMBEDDING_MODEL'])
-            chroma_collection = collection_name if collection_name else app.config['CHROMA_COLLECTION']
-            vector_store = Chroma(
-                client=client,
-                collection_name=chroma_collection,
-                embedding_function=embedding_fn
-            )
-            retriever = vector_store.as_retriever()
-            summary = retriever.invoke(question)
-            
-            if summary and is_rag_relevant(question, summary):
-                logger.info("RAG data is relevant - using RAG search with context")
-                result = chain.invoke({
-                    "summary": str(summary), 
-                    "question": question, 
-                    "context": context
-                })
-            else:
-                # No relevant RAG data found, use context only
-                logger.info("RAG data not relevant or empty - using context only")
-                full_query = f"{context}\n\n{question}"
-                result = model.invoke(full_query)
+        entry = records.get(context_key(session_id))
+        memory = SessionMemory.from_dict(entry['memory']) if entry else SessionMemory()
+
+        plan = plan_chat(question, memory, collection_name, filters)
+        result = cached_invoke(plan, session_id)
         
         if result:
-            # Append new Q&A to context and store it
-            context += f"Question: {question} Answer: {result}\n"
-
-            context_store[session_id] = {
-                'context': context,
-                'last_updated': datetime.now()
-            }
-            
-            response_data = {
-                'status': 'success',
-                'data': {
-                    'question': question,
-                    'answer': result,
-                    'timestamp': datetime.now().isoformat(),
-                    'session_id': session_id
-                }
-            }
-            
-            # Cache response if idempotency key is provided
-            if idempotency_key:
-                cache_response(idempotency_key, response_data, HTTPStatus.OK)
-            
-            return jsonify(response_data), HTTPStatus.OK
+            response_data = finish_chat(session_id, memory, question, result, idempotency_key)
+            with span('serialization'):
+                body = jsonify(response_data)
+            return body, HTTPStatus.OK
 
+    except Overloaded as e:
+        # Not cached for idempotency, so the client can retry with the same key
+        logger.warning(f"Shedding chat request for session {session_id}: {str(e)}")
+        return overloaded_response(e)
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
         error_response = {
@@ -300,166 +825,342 @@ def chat():
 def clear_context():
     """Clear the context for a session"""
     session_id = get_session_id()
-    if session_id in context_store:
-        del context_store[session_id]
+    session_store.delete(context_key(session_id))
     return jsonify({
         'status': 'success',
         'message': 'Context cleared successfully'
     }), HTTPStatus.OK
 
+RAG_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Safari/605.1.15"
+}
+
+def extract_segments(job, kind, location, source):
+    """Stream (text, metadata) segments from an uploaded file or a URL, counting parsed segments on the job"""
+    if kind == 'csv':
+        # One record per row, with the column values as filterable metadata
+        segments = csv_rows(location, source, chunk_rows=app.config['RAG_CSV_CHUNK_ROWS'])
+    elif kind == 'pdf':
+        segments = pdf_segments(location, source)
+    elif kind == 'docx':
+        segments = docx_segments(location, source, segment_chars=app.config['RAG_SEGMENT_CHARS'])
+    else:
+        segments = url_segments(
+            http_session, location, source,
+            headers=RAG_HEADERS,
+            timeout=app.config['HTTP_TIMEOUT'],
+            max_bytes=app.config['RAG_MAX_URL_BYTES'],
+            segment_chars=app.config['RAG_SEGMENT_CHARS']
+        )
+    for segment in segments:
+        job.progress['pages_parsed'] += 1
+        yield segment
+
+def invalidate_collection(collection_name):
+    """Drop everything cached from a collection after it was written to or deleted"""
+    vector_stores.invalidate(collection_name)
+    retriever.invalidate(collection_name)
+    table_catalog.invalidate(collection_name)
+    response_cache.invalidate_collection(collection_name)
+
+def run_ingestion_job(job, kind, location, source):
+    """Parse, chunk, embed and upsert one RAG input as a background job.
+
+    Ingestion is incremental per source: re-ingesting the same source id only
+    embeds chunks that changed and removes chunks that are gone.
+    """
+    try:
+        collection = vector_stores.get_collection(job.collection_name)
+        stats = ingestion_pipeline.run(
+            collection,
+            extract_segments(job, kind, location, source),
+            on_progress=lambda chunks: job.progress.update(chunks_embedded=chunks),
+            should_cancel=job.is_cancelled,
+            source=source
+        )
+    finally:
+        invalidate_collection(job.collection_name)
+        collection_catalog.refresh(job.collection_name)
+    return stats
+
+def upload_source_id(filename, path):
+    """Default source id of an upload: its file name plus a hash of its content.
+
+    Different files that share a name are kept apart, while uploading the
+    very same file again is recognised as unchanged.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return f'{filename}@{digest.hexdigest()[:16]}'
+
+def remove_file(path):
+    """Return a cleanup callback that deletes a temporary upload"""
+    def cleanup():
+        if os.path.exists(path):
+            os.unlink(path)
+    return cleanup
+
 @app.route('/api/v1/rag', methods=['POST'])
 def rag():
-    """Accepts a file (csv, pdf, doc) or a url, extracts content, and creates a Chroma DB collection for RAG."""
+    """Accepts a file (csv, pdf, doc) or a url and queues a background job that loads it into a Chroma DB collection for RAG.
+
+    ``collection_name`` (form field or JSON) picks the collection, defaulting
+    to CHROMA_COLLECTION. ``source_id`` names the document, defaulting to the
+    url, or the file name plus a hash of the file; uploading the same source
+    id again updates it in place.
+    """
     try:
-        collection_name = app.config['CHROMA_COLLECTION']
+        data = {} if 'file' in request.files else (request.get_json(silent=True) or {})
+        fields = request.form if 'file' in request.files else data
+        collection_name = fields.get('collection_name') or app.config['CHROMA_COLLECTION']
         if not collection_name:
             return jsonify({'status': 'error', 'message': 'CHROMA_COLLECTION is not configured in the environment.'}), HTTPStatus.INTERNAL_SERVER_ERROR
+        if not valid_collection_name(collection_name):
+            return jsonify({'status': 'error', 'message': f'Invalid collection name: {collection_name}'}), HTTPStatus.BAD_REQUEST
+        source_id = fields.get('source_id')
 
         # Check if it's a file upload
         if 'file' in request.files:
             file = request.files['file']
             filename = secure_filename(file.filename)
             ext = filename.split('.')[-1].lower()
-            content = ''
             if ext == 'csv':
-                df = pd.read_csv(file)
-                # Concatenate all text columns for embedding
-                content = '\n'.join(df.astype(str).apply(lambda row: ' '.join(row), axis=1))
+                kind = 'csv'
             elif ext == 'pdf':
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-                    file.save(tmp.name)
-                    reader = PyPDF2.PdfReader(tmp.name)
-                    content = '\n'.join(page.extract_text() or '' for page in reader.pages)
+                kind = 'pdf'
             elif ext in ['doc', 'docx']:
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp:
-                    file.save(tmp.name)
-                    doc = docx.Document(tmp.name)
-                    content = '\n'.join([para.text for para in doc.paragraphs])
+                kind = 'docx'
             else:
                 return jsonify({'status': 'error', 'message': 'Unsupported file type.'}), HTTPStatus.BAD_REQUEST
+            # The upload stream is gone once the request ends, so park it on disk for the job
+            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{kind}') as tmp:
+                file.save(tmp)
+            try:
+                source = source_id or upload_source_id(filename, tmp.name)
+                job = ingestion_jobs.submit(
+                    source, collection_name,
+                    lambda job: run_ingestion_job(job, kind, tmp.name, source),
+                    cleanup=remove_file(tmp.name)
+                )
+            except Exception:
+                remove_file(tmp.name)()
+                raise
         else:
             # Assume JSON body for URL
-            data = request.get_json()
             url = data.get('url')
             if not url:
                 return jsonify({'status': 'error', 'message': 'url is required for RAG processing.'}), HTTPStatus.BAD_REQUEST
-            headers = {
-                    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Safari/605.1.15"
-            }
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
-                return jsonify({'status': 'error', 'message': f'Failed to fetch URL: {response.status_code}'}), HTTPStatus.BAD_REQUEST
-            content = response.text
-
-        if not content.strip():
-            return jsonify({'status': 'error', 'message': 'No content extracted from input.'}), HTTPStatus.BAD_REQUEST
-
-        # Create document and store in Chroma
-        doc = Document(page_content=content, metadata={'source': collection_name})
-        embeddings = OllamaEmbeddings(base_url=app.config['OLLAMA_BASE_URL'], model=app.config['OLLAMA_EMBEDDING_MODEL'])
-        client = chromadb.PersistentClient(path=app.config['CHROMA_DB_PATH'])
-        vectorstore = Chroma(
-            client=client,
-            collection_name=collection_name,
-            embedding_function=embeddings
-        )
-        vectorstore.add_documents([doc], ids=['0'])
-        return jsonify({'status': 'success', 'message': f'RAG collection {collection_name} created.'}), HTTPStatus.OK
+            job = ingestion_jobs.submit(
+                source_id or url, collection_name,
+                lambda job: run_ingestion_job(job, 'url', url, source_id or url)
+            )
+
+        return jsonify({
+            'status': 'success',
+            'message': f'RAG ingestion into {collection_name} queued.',
+            'job_id': job.id,
+            'job': job.to_dict()
+        }), HTTPStatus.ACCEPTED
     except Exception as e:
         logger.error(f"Error processing RAG request: {str(e)}")
         return jsonify({'status': 'error', 'message': 'Error processing input for RAG', 'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
+@app.route('/api/v1/rag/jobs/<job_id>', methods=['GET'])
+def rag_job_status(job_id):
+    """Report the progress of a RAG ingestion job"""
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), HTTPStatus.NOT_FOUND
+    return jsonify({'status': 'success', 'job': job.to_dict()}), HTTPStatus.OK
+
+@app.route('/api/v1/rag/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_rag_job(job_id):
+    """Cancel a queued or running RAG ingestion job"""
+    job = ingestion_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), HTTPStatus.NOT_FOUND
+    return jsonify({'status': 'success', 'message': 'Cancellation requested', 'job': job.to_dict()}), HTTPStatus.OK
+
+@app.route('/api/v1/collections', methods=['GET'])
+def list_collections():
+    """List the RAG collections and how many records each holds"""
+    try:
+        sizes = collection_catalog.load()
+        return jsonify({
+            'status': 'success',
+            'collections': [{'name': name, 'documents': size} for name, size in sorted(sizes.items())]
+        }), HTTPStatus.OK
+    except Exception as e:
+        logger.error(f"Error listing collections: {str(e)}")
+        return jsonify({'status': 'error', 'message': 'Error listing collections', 'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@app.route('/api/v1/collections', methods=['POST'])
+@validate_json
+def create_collection():
+    """Create an empty RAG collection"""
+    name = request.get_json().get('name')
+    if not valid_collection_name(name):
+        return jsonify({'status': 'error', 'message': f'Invalid collection name: {name}'}), HTTPStatus.BAD_REQUEST
+    try:
+        collection_catalog.create(name)
+        return jsonify({'status': 'success', 'collection': {'name': name, 'documents': 0}}), HTTPStatus.CREATED
+    except CollectionExists:
+        return jsonify({'status': 'error', 'message': f'Collection {name} already exists'}), HTTPStatus.CONFLICT
+    except Exception as e:
+        logger.error(f"Error creating collection {name}: {str(e)}")
+        return jsonify({'status': 'error', 'message': 'Error creating collection', 'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@app.route('/api/v1/collections/<name>', methods=['GET'])
+def collection_stats(name):
+    """Record count and per-source chunk counts of a collection"""
+    try:
+        return jsonify({'status': 'success', 'collection': collection_catalog.stats(name)}), HTTPStatus.OK
+    except CollectionNotFound:
+        return jsonify({'status': 'error', 'message': 'Collection not found'}), HTTPStatus.NOT_FOUND
+    except Exception as e:
+        logger.error(f"Error reading collection {name}: {str(e)}")
+        return jsonify({'status': 'error', 'message': 'Error reading collection', 'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@app.route('/api/v1/collections/<name>', methods=['DELETE'])
+def delete_collection(name):
+    """Delete a collection and everything cached from it"""
+    try:
+        collection_catalog.delete(name)
+        invalidate_collection(name)
+        return jsonify({'status': 'success', 'message': f'Collection {name} deleted'}), HTTPStatus.OK
+    except CollectionNotFound:
+        return jsonify({'status': 'error', 'message': 'Collection not found'}), HTTPStatus.NOT_FOUND
+    except Exception as e:
+        logger.error(f"Error deleting collection {name}: {str(e)}")
+        return jsonify({'status': 'error', 'message': 'Error deleting collection', 'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@app.route('/api/v1/collections/<name>/sources/<path:source_id>', methods=['DELETE'])
+def delete_collection_source(name, source_id):
+    """Delete every chunk of one source from a collection"""
+    try:
+        if collection_catalog.size(name) is None:
+            return jsonify({'status': 'error', 'message': 'Collection not found'}), HTTPStatus.NOT_FOUND
+        collection = vector_stores.get_collection(name)
+        ids = ingestion_pipeline.existing_ids(collection, source_id)
+        if not ids:
+            return jsonify({'status': 'error', 'message': 'Source not found'}), HTTPStatus.NOT_FOUND
+        collection.delete(where={'source': source_id})
+        invalidate_collection(name)
+        size = collection_catalog.refresh(name)
+        return jsonify({
+            'status': 'success',
+            'message': f'Deleted {len(ids)} chunks of {source_id}',
+            'collection': {'name': name, 'documents': size}
+        }), HTTPStatus.OK
+    except Exception as e:
+        logger.error(f"Error deleting source {source_id} from {name}: {str(e)}")
+        return jsonify({'status': 'error', 'message': 'Error deleting source', 'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+def read_audio_upload():
+    """Bytes of the uploaded ``audio`` file, or an error response tuple"""
+    if 'audio' not in request.files:
+        return None, (jsonify({'status': 'error', 'message': 'No audio file provided'}), HTTPStatus.BAD_REQUEST)
+    audio_file = request.files['audio']
+    if audio_file.filename == '':
+        return None, (jsonify({'status': 'error', 'message': 'No audio file selected'}), HTTPStatus.BAD_REQUEST)
+    return audio_file.read(), None
+
 @app.route('/api/v1/voice/speech-to-text', methods=['POST'])
 def speech_to_text():
     """Convert speech audio to text"""
     try:
-        if 'audio' not in request.files:
-            return jsonify({'status': 'error', 'message': 'No audio file provided'}), HTTPStatus.BAD_REQUEST
-        
-        audio_file = request.files['audio']
-        if audio_file.filename == '':
-            return jsonify({'status': 'error', 'message': 'No audio file selected'}), HTTPStatus.BAD_REQUEST
-        
-        # Save audio file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.audio') as tmp:
-            audio_file.save(tmp.name)
-            audio_path = tmp.name
-        
-        # Convert audio to WAV using pydub
-        try:
-            # Try to detect the format from the file
-            audio = AudioSegment.from_file(audio_path)
-            wav_path = audio_path.replace('.audio', '.wav')
-            audio.export(wav_path, format="wav", parameters=["-ar", "16000", "-ac", "1"])
-        except Exception as e:
-            logger.error(f"Error converting audio format: {str(e)}")
-            # Fallback: try to use the original file if conversion fails
-            wav_path = audio_path
-            logger.info("Using original audio file as fallback")
-        
-        # Initialize recognizer
-        recognizer = sr.Recognizer()
-        
-        # Load audio file
-        with sr.AudioFile(wav_path) as source:
-            # Adjust for ambient noise
-            recognizer.adjust_for_ambient_noise(source, duration=0.5)
-            audio_data = recognizer.record(source)
-        
-        # Convert speech to text
-        text = recognizer.recognize_google(audio_data)
-        
-        # Clean up temporary files
-        os.unlink(audio_path)
-        if wav_path != audio_path:  # Only delete wav file if it's different from original
-            os.unlink(wav_path)
-        
+        audio, error = read_audio_upload()
+        if error:
+            return error
+
+        # Decoded in memory and transcribed in chunks on the STT worker pool
+        text = speech_to_text_service.transcribe(audio)
+
         return jsonify({
             'status': 'success',
             'text': text
         }), HTTPStatus.OK
-        
-    except sr.UnknownValueError:
+
+    except NoSpeechDetected:
         return jsonify({'status': 'error', 'message': 'Could not understand audio. Please speak clearly and try again.'}), HTTPStatus.BAD_REQUEST
-    except sr.RequestError as e:
-        return jsonify({'status': 'error', 'message': f'Speech recognition service error: {str(e)}'}), HTTPStatus.INTERNAL_SERVER_ERROR
+    except SpeechServiceError as e:
+        logger.error(f"Error in speech-to-text: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
     except Exception as e:
         logger.error(f"Error in speech-to-text: {str(e)}")
         return jsonify({'status': 'error', 'message': 'Error processing audio. Please try again.'}), HTTPStatus.INTERNAL_SERVER_ERROR
 
-@app.route('/api/v1/voice/text-to-speech', methods=['POST'])
-@validate_json
+@app.route('/api/v1/voice/speech-to-text/stream', methods=['POST'])
+def speech_to_text_stream():
+    """Transcribe a long recording as server-sent events.
+
+    Emits one ``partial`` event per transcribed chunk as soon as it is ready
+    and a final ``done`` event with the full text, or an ``error`` event.
+    """
+    audio, error = read_audio_upload()
+    if error:
+        return error
+
+    def generate():
+        parts = []
+        try:
+            for index, text in enumerate(speech_to_text_service.stream(audio)):
+                parts.append(text)
+                yield sse_event('partial', {'chunk': index, 'text': text})
+            if not parts:
+                raise NoSpeechDetected()
+            yield sse_event('done', {'text': ' '.join(parts)})
+        except NoSpeechDetected:
+            yield sse_event('error', {'message': 'Could not understand audio. Please speak clearly and try again.'})
+        except Exception as e:
+            logger.error(f"Error in streaming speech-to-text: {str(e)}")
+            yield sse_event('error', {'message': 'Error processing audio. Please try again.'})
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/v1/voice/text-to-speech', methods=['GET', 'POST'])
 def text_to_speech():
-    """Convert text to speech audio using gTTS (Google Text-to-Speech) and return MP3 audio."""
+    """Stream speech audio for ``text`` as binary (WAV for espeak, MP3 for gTTS).
+
+    Accepts ``{"text": ...}`` as a POST body or ``?text=`` on a GET, so an
+    audio element can play the stream directly while later sentences are
+    still being synthesized.
+    """
     try:
-        data = request.get_json()
-        text = data.get('text', '')
-        
-        if not text:
+        if request.method == 'POST':
+            if not request.is_json:
+                return jsonify({'status': 'error', 'message': 'Content-Type must be application/json'}), HTTPStatus.BAD_REQUEST
+            text = request.get_json().get('text', '')
+        else:
+            text = request.args.get('text', '')
+
+        if not text or not text.strip():
             return jsonify({'status': 'error', 'message': 'No text provided'}), HTTPStatus.BAD_REQUEST
-        
-        # Generate speech using gTTS
-        tts = gTTS(text=text, lang='en', slow=False)
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp:
-            audio_path = tmp.name
-            tts.save(audio_path)
-        
-        # Read the generated audio file
-        with open(audio_path, 'rb') as audio_file:
-            audio_data = audio_file.read()
-        
-        # Clean up temporary file
-        os.unlink(audio_path)
-        
-        # Convert to base64 for sending
-        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-        
-        return jsonify({
-            'status': 'success',
-            'audio': audio_base64,
-            'format': 'mp3'
-        }), HTTPStatus.OK
-        
+
+        # Synthesize the first sentence before answering so failures still get a JSON error
+        audio = text_to_speech_service.stream(text)
+        first = next(audio, b'')
+
+        def generate():
+            yield first
+            try:
+                yield from audio
+            except Exception as e:
+                logger.error(f"Error in text-to-speech stream: {str(e)}")
+
+        return Response(generate(), mimetype=text_to_speech_service.mimetype, headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    except SpeechSynthesisError as e:
+        logger.error(f"Error in text-to-speech: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
     except Exception as e:
         logger.error(f"Error in text-to-speech: {str(e)}")
         return jsonify({'status': 'error', 'message': 'Error generating speech'}), HTTPStatus.INTERNAL_SERVER_ERROR
@@ -467,26 +1168,120 @@ def text_to_speech():
 @app.route('/api/v1/chat/stream', methods=['POST'])
 @validate_json
 @log_request
+@trace_request('chat_stream')
 def chat_stream():
-    """Stream LLM response from Ollama to the client."""
+    """Stream the answer as server-sent events using the same pipeline as /api/v1/chat.
+
+    Emits a ``sources`` event with the retrieved documents, one ``token`` event
+    per generated chunk and a final ``done`` event with timing stats. The answer
+    is stored in the session memory once it is complete; if the client goes
+    away first, generation is stopped and nothing is stored. A request repeating
+    an ``X-Idempotency-Key`` whose answer was stored gets that answer replayed
+    as a single token event.
+    """
     try:
         data = request.get_json()
+        session_id = get_session_id()
+        idempotency_key = get_idempotency_key()
         question = data.get("question", "")
-        ollama_url = app.config['OLLAMA_BASE_URL']
-        model = app.config['OLLAMA_MODEL']
-        stream_url = f"{ollama_url}/api/chat"
-        headers = {"Content-Type": "application/json"}
-        payload = {
-            "model": model,
-            "messages": [{"role": "user", "content": question}],
-            "stream": True
-        }
+        collection_name = data.get("collection_name")
+        filters = data.get("filters")
+        if filters is not None:
+            try:
+                validate_filters(filters)
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.BAD_REQUEST
+
+        # Read the idempotency record and the session context in one round trip
+        keys = [context_key(session_id)]
+        if idempotency_key:
+            keys.append(idempotency_record_key(idempotency_key))
+        records = session_store.get_many(keys)
+
+        # A retry with the same key replays the stored answer instead of generating again
+        cached_data = records.get(idempotency_record_key(idempotency_key)) if idempotency_key else None
+        if cached_data:
+            if cached_data['status_code'] != HTTPStatus.OK:
+                return jsonify(cached_data['response']), cached_data['status_code']
+            return Response(replay_events(cached_data), mimetype='text/event-stream', headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            })
+
+        entry = records.get(context_key(session_id))
+        memory = SessionMemory.from_dict(entry['memory']) if entry else SessionMemory()
+        start_time = time.perf_counter()
+        plan = plan_chat(question, memory, collection_name, filters)
+        answer, tier, key = lookup_answer(plan)
+        trace = current_trace()
+        ticket = None
+        if answer is None:
+            # Admission happens before any event is sent so a rejection is still a plain 429/503
+            with span('queue_wait'):
+                ticket = generation_scheduler.acquire(session_id)
+
         def generate():
-            with requests.post(stream_url, json=payload, headers=headers, stream=True) as r:
-                for line in r.iter_lines():
-                    if line:
-                        yield line + b"\n"
-        return Response(generate(), mimetype='text/event-stream')
+            # The body runs after the view returns, so the trace is re-activated here
+            try:
+                with activate(trace):
+                    yield from stream_events()
+            finally:
+                if ticket is not None:
+                    ticket.release()
+
+        def stream_events():
+            yield sse_event('sources', {'scenario': plan['scenario'], 'documents': document_sources(plan['documents'])})
+            first_token_time = None
+            chunks = 0
+            if answer is not None:
+                first_token_time = time.perf_counter()
+                chunks = 1
+                full_answer = answer
+                yield sse_event('token', {'token': answer})
+            else:
+                parts = []
+                stream = stream_answer(plan)
+                try:
+                    for token in stream:
+                        if first_token_time is None:
+                            first_token_time = time.perf_counter()
+                        chunks += 1
+                        parts.append(token)
+                        yield sse_event('token', {'token': token})
+                except GeneratorExit:
+                    logger.info(f"Client disconnected, stopping generation for session {session_id}")
+                    raise
+                except Exception as e:
+                    logger.error(f"Error in streaming chat: {str(e)}")
+                    yield sse_event('error', {'message': 'Internal server error', 'error': str(e)})
+                    return
+                finally:
+                    stream.close()
+                full_answer = ''.join(parts)
+                store_answer(plan, key, full_answer)
+
+            finish_chat(session_id, memory, question, full_answer, idempotency_key)
+            end_time = time.perf_counter()
+            yield sse_event('done', {
+                'session_id': session_id,
+                'cache': tier,
+                'chunks': chunks,
+                'time_to_first_token_ms': round(1000 * (first_token_time - start_time), 1) if first_token_time else None,
+                'total_ms': round(1000 * (end_time - start_time), 1),
+                'timestamp': datetime.now().isoformat()
+            })
+
+        response = Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        if ticket is not None:
+            # Covers a client that leaves before the body is iterated at all
+            response.call_on_close(ticket.release)
+        return response
+    except Overloaded as e:
+        logger.warning(f"Shedding streaming chat request for session {session_id}: {str(e)}")
+        return overloaded_response(e)
     except Exception as e:
         logger.error(f"Error in streaming chat: {str(e)}")
         return jsonify({'status': 'error', 'message': 'Internal server error', 'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
@@ -514,4 +1309,13 @@ def internal_error(error):
 
 if __name__ == "__main__":
     port = int(os.getenv('PORT', app.config['BACKEND_SERVER_PORT']))
-    app.run(host='0.0.0.0', port=port)
+    start_warmup()
+    if app.config['SERVER_MODE'] == 'asgi':
+        import sys
+        import uvicorn
+        # Let asgi.py import this module instead of loading main.py a second time
+        sys.modules['main'] = sys.modules[__name__]
+        from asgi import application
+        uvicorn.run(application, host='0.0.0.0', port=port)
+    else:
+        app.run(host='0.0.0.0', port=port)
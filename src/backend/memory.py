@@ -0,0 +1,132 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """
+Condense the conversation below into a short summary that keeps names, facts and decisions.
+Previous summary: {summary}
+Conversation:
+{turns}
+Summary:
+"""
+
+
+def count_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for prompt budgeting"""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def format_turn(turn):
+    return f"Question: {turn['question']} Answer: {turn['answer']}\n"
+
+
+class SessionMemory:
+    """Conversation turns for one session with a sliding window and a rolling summary.
+
+    Turns pushed out of the window move to ``pending`` until the summarizer folds
+    them into ``summary``; without a summarizer they are simply forgotten. If the
+    summarizer keeps failing, only the newest ``max_pending`` turns are kept
+    waiting so the stored session cannot grow without bound.
+    """
+
+    def __init__(self, turns=None, pending=None, summary=''):
+        self.turns = turns or []
+        self.pending = pending or []
+        self.summary = summary
+
+    def add_turn(self, question, answer, window_turns, max_pending=None):
+        """Record a turn and slide the window, returning how many turns left it"""
+        text = format_turn({'question': question, 'answer': answer})
+        self.turns.append({'question': question, 'answer': answer, 'tokens': count_tokens(text)})
+        overflow = len(self.turns) - window_turns
+        if overflow > 0:
+            self.pending.extend(self.turns[:overflow])
+            del self.turns[:overflow]
+        if max_pending is not None and len(self.pending) > max_pending:
+            dropped = len(self.pending) - max_pending
+            del self.pending[:dropped]
+            logger.warning(f"Dropped {dropped} turns still waiting to be summarized")
+        return max(overflow, 0)
+
+    def build_context(self, token_budget):
+        """Summary plus the most recent turns that fit in the token budget"""
+        header = ''
+        used = 0
+        summary_tokens = count_tokens(self.summary)
+        if self.summary and summary_tokens <= token_budget:
+            header = f"Summary of earlier conversation: {self.summary}\n"
+            used = summary_tokens
+        recent = []
+        for turn in reversed(self.turns):
+            if used + turn['tokens'] > token_budget:
+                break
+            used += turn['tokens']
+            recent.append(format_turn(turn))
+        return header + ''.join(reversed(recent))
+
+    def apply_summary(self, summary, summarized):
+        """Replace the summary after the ``summarized`` pending turns were folded into it"""
+        self.summary = summary
+        # Matched by value: the oldest pending turns may have been dropped meanwhile
+        self.pending = [turn for turn in self.pending if turn not in summarized]
+
+    def drop_pending(self):
+        self.pending = []
+
+    def to_dict(self):
+        return {'turns': self.turns, 'pending': self.pending, 'summary': self.summary}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(turns=list(data.get('turns', [])), pending=list(data.get('pending', [])),
+                   summary=data.get('summary', ''))
+
+
+class MemorySummarizer:
+    """Fold turns that left a session's window into its rolling summary in the background.
+
+    Each pass summarizes at most ``max_turns`` pending turns, which bounds the
+    summary prompt however far behind the session is.
+    """
+
+    def __init__(self, invoke, load_memory, save_memory, max_workers=1, max_turns=16):
+        self.invoke = invoke
+        self.max_turns = max_turns
+        self.load_memory = load_memory
+        self.save_memory = save_memory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='summary')
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def submit(self, session_id):
+        """Schedule a summary pass for a session unless one is already running"""
+        with self._lock:
+            if session_id in self._in_flight:
+                return
+            self._in_flight.add(session_id)
+        self._executor.submit(self._summarize, session_id)
+
+    def _summarize(self, session_id):
+        try:
+            memory = self.load_memory(session_id)
+            if memory is None or not memory.pending:
+                return
+            turns = memory.pending[:self.max_turns]
+            summary = self.invoke(SUMMARY_PROMPT.format(
+                summary=memory.summary or 'None',
+                turns=''.join(format_turn(turn) for turn in turns)
+            ))
+            # Re-read so turns added while the model was running are kept
+            memory = self.load_memory(session_id)
+            if memory is None:
+                return
+            memory.apply_summary(summary.strip(), turns)
+            self.save_memory(session_id, memory)
+            logger.info(f"Summarized {len(turns)} turns for session {session_id}")
+        except Exception as e:
+            logger.error(f"Error summarizing session {session_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(session_id)
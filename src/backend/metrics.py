@@ -0,0 +1,249 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+def format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a monotonic count kept by another component (read at scrape time)"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        with self._lock:
+            return self.header() + [f'{self.name}{format_labels(self.labelnames, key)} {value}'
+                                    for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        with self._lock:
+            return self.header() + [f'{self.name}{format_labels(self.labelnames, key)} {value}'
+                                    for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, observations = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            # Buckets are cumulative: every bound at or above the value counts it
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, observations + 1)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for key, (counts, total, observations) in self._values.items():
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{format_labels(self.labelnames, key, [("le", bound)])} {count}')
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, key, [("le", "+Inf")])} {observations}')
+                lines.append(f'{self.name}_sum{format_labels(self.labelnames, key)} {total}')
+                lines.append(f'{self.name}_count{format_labels(self.labelnames, key)} {observations}')
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format.
+
+    ``collector`` callbacks run at scrape time to refresh gauges that mirror
+    other components' stats (cache sizes, hit ratios, ...).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        for fn in self._collectors:
+            fn()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def process_rss_bytes():
+    """Current resident set size of this process, or 0 where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class RequestTrace:
+    """Per-request stage timings, observed into the stage histogram when finished"""
+
+    def __init__(self, endpoint, trace_id=None):
+        self.endpoint = endpoint
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.scenario = 'unknown'
+        self.spans = {}
+        self.start = time.perf_counter()
+        self.finished = False
+
+    def record(self, stage, seconds):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def server_timing(self):
+        """Stage timings formatted for the Server-Timing response header"""
+        return ', '.join(f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in self.spans.items())
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def activate(trace):
+    """Make ``trace`` the current trace for the enclosed block"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as ``stage`` of the current request, if one is being traced"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(stage, time.perf_counter() - start)
+
+
+class ChatMetrics:
+    """The chat pipeline's metric families"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.stage_seconds = registry.histogram(
+            'chat_stage_seconds', 'Time spent in each chat pipeline stage', ('stage', 'scenario', 'endpoint'))
+        self.request_seconds = registry.histogram(
+            'chat_request_seconds', 'End-to-end chat request latency', ('scenario', 'endpoint'))
+        self.requests = registry.counter('chat_requests_total', 'Chat requests handled', ('scenario', 'endpoint'))
+        self.in_flight = registry.gauge('chat_requests_in_flight', 'Chat requests currently being processed', ('endpoint',))
+        self.tokens = registry.counter('llm_tokens_total', 'Tokens reported by Ollama', ('kind',))
+        self.tokens_per_second = registry.histogram(
+            'llm_generation_tokens_per_second', 'Generation throughput reported by Ollama eval counters', (),
+            buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500))
+
+    def start(self, endpoint, trace_id=None):
+        self.in_flight.inc(endpoint=endpoint)
+        return RequestTrace(endpoint, trace_id)
+
+    def finish(self, trace):
+        if trace.finished:
+            return
+        trace.finished = True
+        self.in_flight.dec(endpoint=trace.endpoint)
+        for stage, seconds in trace.spans.items():
+            self.stage_seconds.observe(seconds, stage=stage, scenario=trace.scenario, endpoint=trace.endpoint)
+        self.request_seconds.observe(time.perf_counter() - trace.start, scenario=trace.scenario, endpoint=trace.endpoint)
+        self.requests.inc(scenario=trace.scenario, endpoint=trace.endpoint)
+
+    def record_usage(self, info):
+        """Count tokens from an Ollama response's eval counters"""
+        if info.get('prompt_eval_count'):
+            self.tokens.inc(info['prompt_eval_count'], kind='prompt')
+        if info.get('eval_count'):
+            self.tokens.inc(info['eval_count'], kind='completion')
+            if info.get('eval_duration'):
+                self.tokens_per_second.observe(info['eval_count'] / (info['eval_duration'] / 1e9))
+
+
+class OllamaUsageCallback(BaseCallbackHandler):
+    """LangChain callback that feeds Ollama's eval counters into ChatMetrics"""
+
+    def __init__(self, chat_metrics):
+        self.chat_metrics = chat_metrics
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                self.chat_metrics.record_usage(generation.generation_info or {})
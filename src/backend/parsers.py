@@ -0,0 +1,176 @@
+"""Streaming parsers that turn RAG inputs into ``(text, metadata)`` segments.
+
+Each parser is a generator that reads its input incrementally and yields
+segments of roughly ``segment_chars`` characters, so the ingestion pipeline
+can chunk and embed them as they arrive and peak memory does not grow with
+the size of the input. The format libraries are imported by the parser that
+needs them, so they are only loaded once such a file is ingested.
+"""
+import codecs
+import logging
+import re
+from html.parser import HTMLParser
+
+from tables import ROW_RECORD, coerce
+
+logger = logging.getLogger(__name__)
+
+SKIPPED_HTML_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head'}
+BLOCK_HTML_TAGS = {'p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'section', 'article',
+                   'header', 'footer', 'blockquote', 'pre', 'table', 'ul', 'ol'}
+CHARSET_PATTERN = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+class ContentTooLarge(ValueError):
+    """Raised when a downloaded document exceeds the configured size cap"""
+
+
+def csv_rows(path, source, chunk_rows=1000):
+    """Read a CSV in chunks of ``chunk_rows`` rows and yield one record per row.
+
+    The text is the ``column: value`` pairs exactly as written in the file,
+    for embedding; the metadata carries the typed column values so retrieval
+    can filter on them with ``where``.
+    """
+    import pandas as pd
+    row = 0
+    for frame in pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False):
+        columns = [str(column).strip() for column in frame.columns]
+        for values in frame.itertuples(index=False, name=None):
+            cells = [(column, value.strip()) for column, value in zip(columns, values)]
+            text = ', '.join(f'{column}: {value}' for column, value in cells if value != '')
+            metadata = {column: coerce(value) for column, value in cells if value != ''}
+            metadata.update(source=source, row=row, record_type=ROW_RECORD)
+            yield text, metadata
+            row += 1
+
+
+def pdf_segments(path, source):
+    """Yield the text of a PDF one page at a time"""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        yield page.extract_text() or '', {'source': source, 'page': number}
+
+
+def docx_segments(path, source, segment_chars=8000):
+    """Yield DOCX paragraphs grouped into segments of about ``segment_chars`` characters"""
+    import docx
+    document = docx.Document(path)
+    parts = []
+    size = 0
+    for paragraph in document.paragraphs:
+        if not paragraph.text:
+            continue
+        parts.append(paragraph.text)
+        size += len(paragraph.text) + 1
+        if size >= segment_chars:
+            yield '\n'.join(parts), {'source': source}
+            parts = []
+            size = 0
+    if parts:
+        yield '\n'.join(parts), {'source': source}
+
+
+def split_last_line(text):
+    """Split text into everything up to the last line (or word) break and the partial rest after it"""
+    cut = text.rfind('\n')
+    if cut < 0:
+        cut = text.rfind(' ')
+    if cut < 0:
+        return text, ''
+    return text[:cut], text[cut + 1:]
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Incremental HTML-to-text converter; call ``feed`` repeatedly and drain with ``pop_text``"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_HTML_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_HTML_TAGS:
+            self._parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_HTML_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_HTML_TAGS:
+            self._parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._parts.append(data)
+
+    def pending(self):
+        return sum(len(part) for part in self._parts)
+
+    def pop_text(self, final=False):
+        text = ''.join(self._parts)
+        self._parts = []
+        if not final:
+            # Keep the trailing partial line so words are not cut at segment boundaries
+            text, tail = split_last_line(text)
+            self._parts.append(tail)
+        text = re.sub(r'[ \t\r\f\v]+', ' ', text)
+        return re.sub(r'\s*\n\s*', '\n', text).strip()
+
+
+def url_segments(session, url, source, headers=None, timeout=30, max_bytes=20 * 1024 * 1024,
+                 segment_chars=8000, read_size=64 * 1024):
+    """Download a URL as a stream and yield its text in segments.
+
+    The body is never held in full: it is decoded incrementally, HTML is
+    reduced to visible text on the fly, and the download is aborted with
+    ContentTooLarge once it exceeds ``max_bytes``.
+    """
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code != 200:
+            raise ValueError(f'Failed to fetch URL: {response.status_code}')
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ContentTooLarge(f'URL content is {length} bytes, over the {max_bytes} byte limit')
+
+        content_type = response.headers.get('Content-Type', '')
+        match = CHARSET_PATTERN.search(content_type)
+        try:
+            decoder = codecs.getincrementaldecoder(match.group(1) if match else 'utf-8')(errors='replace')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        html = 'html' in content_type or not content_type
+        extractor = HTMLTextExtractor() if html else None
+        buffer = []
+        buffered = 0
+        received = 0
+
+        for block in response.iter_content(chunk_size=read_size):
+            received += len(block)
+            if received > max_bytes:
+                raise ContentTooLarge(f'URL content exceeds the {max_bytes} byte limit')
+            text = decoder.decode(block)
+            if extractor is not None:
+                extractor.feed(text)
+                if extractor.pending() >= segment_chars:
+                    yield extractor.pop_text(), {'source': source}
+            else:
+                buffer.append(text)
+                buffered += len(text)
+                if buffered >= segment_chars:
+                    text, tail = split_last_line(''.join(buffer))
+                    yield text, {'source': source}
+                    buffer = [tail]
+                    buffered = len(tail)
+
+        text = decoder.decode(b'', final=True)
+        if extractor is not None:
+            extractor.feed(text)
+            extractor.close()
+            yield extractor.pop_text(final=True), {'source': source}
+        else:
+            buffer.append(text)
+            yield ''.join(buffer), {'source': source}
+        logger.info(f"Fetched {received} bytes from {url}")
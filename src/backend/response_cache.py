@@ -0,0 +1,123 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_prompt(text):
+    """Lowercase and collapse whitespace so trivially different prompts share a key"""
+    return ' '.join(text.lower().split())
+
+
+class ResponseCache:
+    """Two-tier LRU/TTL cache of LLM answers.
+
+    The exact tier is keyed on the normalized prompt, the model, the ids of
+    the retrieved documents and any metadata filters. The optional semantic tier stores the question
+    embedding and reuses an answer when a new question is at least
+    ``semantic_threshold`` cosine-similar to a cached one for the same model and
+    collection. Entries are tagged with the collection they were built from so
+    they can be dropped when that collection changes.
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600, semantic_enabled=False, semantic_threshold=0.95,
+                 semantic_max_entries=500):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_enabled = semantic_enabled
+        self.semantic_threshold = semantic_threshold
+        self.semantic_max_entries = semantic_max_entries
+        self._exact = OrderedDict()
+        self._semantic = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def exact_key(model, prompt, doc_ids, filters=None):
+        # Filters shape computed table facts even when no document differs
+        payload = '\x1f'.join([model or '', normalize_prompt(prompt), json.dumps(filters or {}, sort_keys=True)]
+                               + sorted(doc_ids))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def lookup(self, key, model, collection, vector=None):
+        """Return ``(answer, tier)`` for a prompt, or ``(None, None)`` on a miss.
+
+        The semantic tier is only consulted when a question vector is given.
+        """
+        with self._lock:
+            now = time.monotonic()
+            entry = self._exact.get(key)
+            if entry is not None and entry['expires_at'] > now:
+                self._exact.move_to_end(key)
+                self._stats['exact_hits'] += 1
+                return entry['answer'], 'exact'
+            if entry is not None:
+                del self._exact[key]
+
+            if self.semantic_enabled and vector is not None:
+                for expired in [k for k, e in self._semantic.items() if e['expires_at'] <= now]:
+                    del self._semantic[expired]
+                candidates = [(k, e) for k, e in self._semantic.items()
+                              if e['model'] == model and e['collection'] == collection]
+                if candidates:
+                    scores = np.stack([e['vector'] for _, e in candidates]) @ self._unit(vector)
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.semantic_threshold:
+                        match, entry = candidates[best]
+                        self._semantic.move_to_end(match)
+                        self._stats['semantic_hits'] += 1
+                        return entry['answer'], 'semantic'
+
+            self._stats['misses'] += 1
+            return None, None
+
+    def put(self, key, answer, model, collection, vector=None):
+        """Store an answer in the exact tier and, when a question vector is given, the semantic tier"""
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl
+            self._exact[key] = {'answer': answer, 'collection': collection, 'expires_at': expires_at}
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+                self._stats['evictions'] += 1
+
+            if self.semantic_enabled and vector is not None:
+                self._semantic[key] = {
+                    'answer': answer,
+                    'model': model,
+                    'collection': collection,
+                    'vector': self._unit(vector),
+                    'expires_at': expires_at
+                }
+                self._semantic.move_to_end(key)
+                while len(self._semantic) > self.semantic_max_entries:
+                    self._semantic.popitem(last=False)
+                    self._stats['evictions'] += 1
+
+    def invalidate_collection(self, collection):
+        """Drop every answer built from a collection"""
+        with self._lock:
+            for tier in (self._exact, self._semantic):
+                for key in [k for k, e in tier.items() if e['collection'] == collection]:
+                    del tier[key]
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            hits = self._stats['exact_hits'] + self._stats['semantic_hits']
+            lookups = hits + self._stats['misses']
+            return dict(
+                self._stats,
+                exact_entries=len(self._exact),
+                semantic_entries=len(self._semantic),
+                hit_ratio=round(hits / lookups, 4) if lookups else 0.0
+            )
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
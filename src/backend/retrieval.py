@@ -0,0 +1,177 @@
+import logging
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+from langchain_core.documents import Document
+
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1]
+
+
+class BM25Index:
+    """In-process inverted index over the chunks of one collection (postings only, no text)"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}
+        self.total_length = 0
+
+    def add(self, doc_id, text):
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings[term][doc_id] = tf
+        self.doc_terms[doc_id] = (list(counts), sum(counts.values()))
+        self.total_length += self.doc_terms[doc_id][1]
+
+    def remove(self, doc_id):
+        terms, length = self.doc_terms.pop(doc_id, ((), 0))
+        for term in terms:
+            self.postings[term].pop(doc_id, None)
+            if not self.postings[term]:
+                del self.postings[term]
+        self.total_length -= length
+
+    def search(self, query, k):
+        """Return up to k ``(doc_id, score)`` pairs, best first"""
+        n = len(self.doc_terms)
+        if not n:
+            return []
+        avg_length = self.total_length / n
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                length = self.doc_terms[doc_id][1]
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class HybridRetriever:
+    """Vector retrieval gated on cosine similarity, optionally fused with BM25.
+
+    Vector hits below ``score_threshold`` and lexical hits below
+    ``bm25_min_score`` are dropped; the survivors are merged with reciprocal
+    rank fusion and only the best ``top_k`` are returned. An empty result means
+    the collection has nothing relevant to the question.
+
+    With a metadata ``where`` filter up to ``filtered_top_k`` matching records
+    (e.g. table rows) are returned. Only a filter the client asked for
+    (``gated=False``) decides relevance by itself and skips the similarity
+    threshold; filters guessed from the question are still gated, so a
+    passing mention of a value ("is 2024 a leap year") pulls in no rows.
+    """
+
+    def __init__(self, registry, top_k=4, fetch_k=20, score_threshold=0.55, hybrid_enabled=False,
+                 bm25_min_score=1.0, rrf_k=60, filtered_top_k=20):
+        self.registry = registry
+        self.top_k = top_k
+        self.filtered_top_k = filtered_top_k
+        self.fetch_k = fetch_k
+        self.score_threshold = score_threshold
+        self.hybrid_enabled = hybrid_enabled
+        self.bm25_min_score = bm25_min_score
+        self.rrf_k = rrf_k
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def index_for(self, collection_name):
+        """BM25 index for a collection, built from Chroma on first use"""
+        with self._lock:
+            index = self._indexes.get(collection_name)
+            if index is not None:
+                return index
+            index = BM25Index()
+            collection = self.registry.get_collection(collection_name)
+            offset = 0
+            while True:
+                page = collection.get(include=['documents'], limit=1000, offset=offset)
+                if not page['ids']:
+                    break
+                for doc_id, text in zip(page['ids'], page['documents']):
+                    index.add(doc_id, text or '')
+                offset += len(page['ids'])
+            logger.info(f"Built BM25 index for '{collection_name}' over {offset} chunks")
+            self._indexes[collection_name] = index
+            return index
+
+    def invalidate(self, collection_name):
+        """Drop the lexical index of a collection; it is rebuilt on the next query"""
+        with self._lock:
+            self._indexes.pop(collection_name, None)
+
+    def vector_search(self, collection, question_vector, where=None, n_results=None):
+        """Return ``(doc_id, similarity, text, metadata)`` for the nearest chunks matching ``where``"""
+        if collection.count() == 0:
+            return []
+        result = collection.query(
+            query_embeddings=[question_vector],
+            n_results=n_results or self.fetch_k,
+            where=where,
+            include=['documents', 'metadatas', 'embeddings']
+        )
+        embeddings = np.asarray(result['embeddings'][0], dtype=np.float32)
+        if not len(embeddings):
+            return []
+        query = np.asarray(question_vector, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query)
+        similarities = (embeddings @ query) / np.where(norms == 0, 1, norms)
+        return list(zip(result['ids'][0], similarities.tolist(), result['documents'][0], result['metadatas'][0]))
+
+    def retrieve(self, question, question_vector, collection_name, where=None, gated=True):
+        """Return the relevant Documents for a question, best first (possibly none)"""
+        with span('vector_store_setup'):
+            collection = self.registry.get_collection(collection_name)
+
+        top_k = self.filtered_top_k if where else self.top_k
+        with span('retrieval'):
+            vector_hits = self.vector_search(collection, question_vector, where, max(self.fetch_k, top_k))
+            lexical_hits = self.index_for(collection_name).search(question, self.fetch_k) if self.hybrid_enabled else []
+            if where and lexical_hits:
+                # The BM25 index has no metadata, so keep only hits that pass the filter
+                allowed = set(collection.get(ids=[doc_id for doc_id, _ in lexical_hits], where=where, include=[])['ids'])
+                lexical_hits = [hit for hit in lexical_hits if hit[0] in allowed]
+
+        with span('relevance_check'):
+            found = {}
+            fused = defaultdict(float)
+            if gated or not where:
+                vector_hits = [hit for hit in vector_hits if hit[1] >= self.score_threshold]
+            for rank, (doc_id, similarity, text, metadata) in enumerate(vector_hits):
+                found[doc_id] = {'text': text, 'metadata': dict(metadata or {}, similarity=round(similarity, 4))}
+                fused[doc_id] += 1 / (self.rrf_k + rank + 1)
+
+            lexical_hits = [hit for hit in lexical_hits if hit[1] >= self.bm25_min_score]
+            for rank, (doc_id, score) in enumerate(lexical_hits):
+                found.setdefault(doc_id, {'text': None, 'metadata': {}})['metadata']['bm25'] = round(score, 4)
+                fused[doc_id] += 1 / (self.rrf_k + rank + 1)
+
+            ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+
+        # Lexical-only hits still need their text and metadata from Chroma
+        missing = [doc_id for doc_id in ranked if found[doc_id]['text'] is None]
+        if missing:
+            with span('retrieval'):
+                page = collection.get(ids=missing, include=['documents', 'metadatas'])
+            for doc_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+                found[doc_id]['text'] = text
+                found[doc_id]['metadata'] = dict(metadata or {}, **found[doc_id]['metadata'])
+
+        return [Document(page_content=found[doc_id]['text'] or '', metadata=found[doc_id]['metadata'], id=doc_id)
+                for doc_id in ranked]
@@ -0,0 +1,229 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of queued; carries the HTTP status and Retry-After"""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class EmbeddingBatcher(Embeddings):
+    """Coalesce concurrent ``embed_query`` calls into batched ``embed_documents`` calls.
+
+    Queries arriving within ``window`` seconds of each other (up to
+    ``max_batch`` of them) are sent to the wrapped model in a single request.
+    ``embed_documents`` already carries a batch and is passed straight through.
+    A caller waits at most ``timeout`` seconds for its batch to come back.
+    """
+
+    def __init__(self, embeddings, max_batch=64, window=0.005, max_concurrent_batches=2, timeout=None):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.window = window
+        self.timeout = timeout
+        self._pending = []
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix='embed-batch')
+        self._collector = None
+        self._stats = {'queries': 0, 'batches': 0, 'largest_batch': 0}
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        future = Future()
+        with self._cond:
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, name='embed-batcher', daemon=True)
+                self._collector.start()
+            self._pending.append((text, future))
+            self._cond.notify()
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise TimeoutError(f'Embedding request timed out after {self.timeout}s')
+
+    def _collect(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Hold the first query briefly so concurrent ones can join its batch
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                self._stats['queries'] += len(batch)
+                self._stats['batches'] += 1
+                self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            self._executor.submit(self._flush, batch)
+
+    def _flush(self, batch):
+        texts = list(OrderedDict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for text, future in batch:
+            future.set_result(vectors[text])
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._stats,
+                avg_batch_size=round(self._stats['queries'] / self._stats['batches'], 2) if self._stats['batches'] else 0.0
+            )
+
+
+class Ticket:
+    """A granted generation slot; ``release`` is idempotent"""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.start = time.perf_counter()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.scheduler._release(time.perf_counter() - self.start)
+
+
+class _Waiter:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.event = threading.Event()
+        self.enqueued = time.perf_counter()
+
+
+class GenerationScheduler:
+    """Admission control for one model: capped in-flight generations and a fair per-session queue.
+
+    At most ``max_inflight`` generations run at once. Waiting requests are
+    queued per session and granted round-robin across sessions, so one client
+    sending a burst cannot starve the others. Requests are rejected up front
+    with 429 when their session already has ``session_max_queued`` waiting,
+    and with 503 when the expected queue wait (queue depth times the moving
+    average generation time) exceeds ``latency_budget`` seconds.
+    """
+
+    def __init__(self, model_name, max_inflight=4, latency_budget=10.0, session_max_queued=2,
+                 initial_service_time=2.0):
+        self.model_name = model_name
+        self.max_inflight = max_inflight
+        self.latency_budget = latency_budget
+        self.session_max_queued = session_max_queued
+        self.service_time = initial_service_time
+        self._inflight = 0
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._stats = {'granted': 0, 'rejected_session': 0, 'rejected_overload': 0, 'timed_out': 0,
+                       'queue_wait_seconds': 0.0}
+
+    def expected_wait(self, position):
+        """Seconds the request at ``position`` in the queue (0-based) is expected to wait"""
+        return math.ceil((position + 1) / self.max_inflight) * self.service_time
+
+    def acquire(self, session_id):
+        """Wait for a generation slot and return its Ticket, or raise Overloaded"""
+        with self._lock:
+            if self._inflight < self.max_inflight and not self._queued:
+                self._inflight += 1
+                self._stats['granted'] += 1
+                return Ticket(self)
+
+            session_queue = self._queues.get(session_id)
+            if session_queue is not None and len(session_queue) >= self.session_max_queued:
+                self._stats['rejected_session'] += 1
+                raise Overloaded('Too many queued requests for this session', 429,
+                                 self._retry_after(len(session_queue)))
+            wait = self.expected_wait(self._queued)
+            if wait > self.latency_budget:
+                self._stats['rejected_overload'] += 1
+                raise Overloaded(f'Model {self.model_name} is overloaded', 503, self._retry_after(self._queued))
+
+            waiter = _Waiter(session_id)
+            self._queues.setdefault(session_id, deque()).append(waiter)
+            self._queued += 1
+
+        if waiter.event.wait(timeout=self.latency_budget):
+            return Ticket(self)
+        with self._lock:
+            if waiter.event.is_set():
+                # Granted just as the wait timed out
+                return Ticket(self)
+            self._remove(waiter)
+            self._stats['timed_out'] += 1
+            raise Overloaded(f'Timed out waiting for model {self.model_name}', 503, self._retry_after(self._queued))
+
+    @contextmanager
+    def slot(self, session_id):
+        ticket = self.acquire(session_id)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def _retry_after(self, position):
+        return max(1, math.ceil(self.expected_wait(position)))
+
+    def _remove(self, waiter):
+        session_queue = self._queues.get(waiter.session_id)
+        if session_queue is not None and waiter in session_queue:
+            session_queue.remove(waiter)
+            self._queued -= 1
+            if not session_queue:
+                del self._queues[waiter.session_id]
+
+    def _release(self, duration):
+        with self._lock:
+            # Exponential moving average of how long a generation holds its slot
+            self.service_time = 0.8 * self.service_time + 0.2 * duration
+            self._inflight -= 1
+            if self._queues:
+                # Round-robin: serve the session at the head, then move it to the back
+                session_id, session_queue = next(iter(self._queues.items()))
+                waiter = session_queue.popleft()
+                self._queued -= 1
+                if session_queue:
+                    self._queues.move_to_end(session_id)
+                else:
+                    del self._queues[session_id]
+                self._inflight += 1
+                self._stats['granted'] += 1
+                self._stats['queue_wait_seconds'] += time.perf_counter() - waiter.enqueued
+                waiter.event.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                model=self.model_name,
+                inflight=self._inflight,
+                max_inflight=self.max_inflight,
+                queued=self._queued,
+                queued_sessions=len(self._queues),
+                service_time_seconds=round(self.service_time, 3)
+            )
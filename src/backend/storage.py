@@ -0,0 +1,215 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from ttl_store import TTLStore
+
+logger = logging.getLogger(__name__)
+
+
+def namespace_of(key):
+    """Keys look like ``<namespace>:<id>``; the namespace selects the TTL"""
+    return key.split(':', 1)[0]
+
+
+class SessionStore(ABC):
+    """Key/value storage for session context and idempotency records.
+
+    ``namespaces`` maps a key prefix to its options; ``ttl`` is required and the
+    in-memory backend also honours ``max_entries`` and ``max_bytes``. Values
+    must be JSON-serializable so every backend can share them across processes.
+    Reads and writes are batched: a request should issue one ``get_many`` and
+    one ``set_many``.
+    """
+
+    def __init__(self, namespaces):
+        self.namespaces = namespaces
+
+    def ttl_for(self, key):
+        return self.namespaces[namespace_of(key)]['ttl']
+
+    @abstractmethod
+    def get_many(self, keys):
+        """Return a dict of the live values for ``keys``; missing keys are omitted"""
+
+    @abstractmethod
+    def set_many(self, items):
+        """Write a dict of key -> value, each with its namespace TTL"""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove a key if present"""
+
+    @abstractmethod
+    def stats(self):
+        """Backend name plus ``{namespace: {'entries': ...}}`` for each namespace"""
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+
+class MemoryStore(SessionStore):
+    """Process-local backend with one TTLStore per namespace (single worker only)"""
+
+    def __init__(self, namespaces, sweep_interval=None):
+        super().__init__(namespaces)
+        self._stores = {
+            name: TTLStore(
+                ttl=options['ttl'],
+                max_entries=options.get('max_entries'),
+                max_bytes=options.get('max_bytes'),
+                sweep_interval=sweep_interval,
+                name=name
+            )
+            for name, options in namespaces.items()
+        }
+
+    def get_many(self, keys):
+        values = {}
+        for key in keys:
+            value = self._stores[namespace_of(key)].get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set_many(self, items):
+        for key, value in items.items():
+            self._stores[namespace_of(key)][key] = value
+
+    def delete(self, key):
+        self._stores[namespace_of(key)].pop(key)
+
+    def stats(self):
+        return {'backend': 'memory', **{name: store.stats() for name, store in self._stores.items()}}
+
+
+class SQLiteStore(SessionStore):
+    """SQLite-backed store for several workers on one host.
+
+    Each thread keeps its own connection; WAL mode lets readers run alongside
+    the single writer. Expired rows are filtered on read and deleted by a
+    background sweeper.
+    """
+
+    def __init__(self, namespaces, path, sweep_interval=None):
+        super().__init__(namespaces)
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS kv_expires_at ON kv (expires_at)')
+        if sweep_interval:
+            threading.Thread(target=self._sweep_forever, args=(sweep_interval,), name='sqlite-store-sweeper',
+                             daemon=True).start()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        placeholders = ','.join('?' for _ in keys)
+        rows = self._connection().execute(
+            f'SELECT key, value FROM kv WHERE key IN ({placeholders}) AND expires_at > ?',
+            [*keys, time.time()]
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def set_many(self, items):
+        now = time.time()
+        rows = [(key, json.dumps(value), now + self.ttl_for(key)) for key, value in items.items()]
+        with self._connection() as conn:
+            conn.executemany('INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)', rows)
+
+    def delete(self, key):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM kv WHERE key = ?', (key,))
+
+    def sweep(self):
+        with self._connection() as conn:
+            return conn.execute('DELETE FROM kv WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def _sweep_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping SQLite store: {str(e)}")
+
+    def stats(self):
+        rows = self._connection().execute(
+            "SELECT substr(key, 1, instr(key, ':') - 1), COUNT(*), SUM(LENGTH(value)) FROM kv WHERE expires_at > ? GROUP BY 1",
+            (time.time(),)
+        ).fetchall()
+        return {'backend': 'sqlite', **{name: {'entries': count, 'bytes': size or 0} for name, count, size in rows}}
+
+
+class RedisStore(SessionStore):
+    """Redis-protocol backend for multiple nodes; expiry is delegated to the server.
+
+    Pass ``client`` to use an existing connection (for example a fakeredis
+    instance in tests); otherwise one is created from ``url``. Per-namespace
+    entry counts need a SCAN over the keyspace, so ``stats`` reuses them for
+    ``stats_interval`` seconds.
+    """
+
+    def __init__(self, namespaces, url=None, client=None, stats_interval=15):
+        super().__init__(namespaces)
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.stats_interval = stats_interval
+        self._namespace_stats = None
+        self._namespace_stats_at = 0.0
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        return {key: json.loads(value) for key, value in zip(keys, self.client.mget(keys)) if value is not None}
+
+    def set_many(self, items):
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(key, json.dumps(value), ex=self.ttl_for(key))
+        pipe.execute()
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def stats(self):
+        now = time.monotonic()
+        if self._namespace_stats is None or now - self._namespace_stats_at >= self.stats_interval:
+            self._namespace_stats = {
+                name: {'entries': sum(1 for _ in self.client.scan_iter(match=f'{name}:*', count=1000))}
+                for name in self.namespaces
+            }
+            self._namespace_stats_at = now
+        return {'backend': 'redis', 'entries': self.client.dbsize(), **self._namespace_stats}
+
+
+def create_store(backend, namespaces, sqlite_path=None, redis_url=None, sweep_interval=None):
+    """Build the configured SessionStore backend"""
+    if backend == 'memory':
+        return MemoryStore(namespaces, sweep_interval=sweep_interval)
+    if backend == 'sqlite':
+        return SQLiteStore(namespaces, sqlite_path, sweep_interval=sweep_interval)
+    if backend == 'redis':
+        return RedisStore(namespaces, url=redis_url)
+    raise ValueError(f'Unknown session store backend: {backend}')
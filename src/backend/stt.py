@@ -0,0 +1,208 @@
+import io
+import logging
+import subprocess
+import threading
+import time
+import wave
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+class NoSpeechDetected(Exception):
+    """Raised when the audio contains nothing the engine could transcribe"""
+
+
+class SpeechServiceError(Exception):
+    """Raised when the speech engine itself fails (network, model, decoder)"""
+
+
+def decode_audio(data, sample_rate=SAMPLE_RATE):
+    """Decode an uploaded recording to mono int16 PCM at ``sample_rate``, entirely in memory.
+
+    16-bit WAV at the target rate is parsed directly; anything else (webm/opus,
+    mp4, mp3, other WAV layouts) is piped through ffmpeg's stdin/stdout.
+    """
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            if wav.getsampwidth() == 2 and wav.getnchannels() == 1 and wav.getframerate() == sample_rate:
+                return np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+    except (wave.Error, EOFError):
+        pass
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+             '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1'],
+            input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        )
+    except FileNotFoundError:
+        raise SpeechServiceError('ffmpeg is not installed')
+    except subprocess.CalledProcessError as e:
+        raise SpeechServiceError(f"Could not decode audio: {e.stderr.decode('utf-8', 'replace').strip()}")
+    return np.frombuffer(result.stdout, dtype='<i2')
+
+
+def split_audio(samples, chunk_seconds=30, search_seconds=2, sample_rate=SAMPLE_RATE):
+    """Split PCM into chunks of at most ``chunk_seconds``, cutting at the quietest 100ms
+    in the last ``search_seconds`` of each chunk so words are not cut in half"""
+    chunk = int(chunk_seconds * sample_rate)
+    frame = sample_rate // 10
+    chunks = []
+    start = 0
+    while len(samples) - start > chunk:
+        window_start = start + chunk - int(search_seconds * sample_rate)
+        window = samples[window_start:start + chunk].astype(np.float32)
+        frames = len(window) // frame
+        if frames:
+            energy = (window[:frames * frame].reshape(frames, frame) ** 2).mean(axis=1)
+            cut = window_start + int(energy.argmin()) * frame + frame // 2
+        else:
+            cut = start + chunk
+        chunks.append(samples[start:cut])
+        start = cut
+    chunks.append(samples[start:])
+    return chunks
+
+
+class STTEngine(ABC):
+    """Transcribes one chunk of mono int16 PCM at 16kHz"""
+
+    name = None
+
+    def load(self):
+        """Load models ahead of the first request (no-op for remote engines)"""
+
+    @abstractmethod
+    def transcribe(self, samples):
+        """Return the text spoken in ``samples``, or '' if nothing was recognized"""
+
+
+class GoogleSTT(STTEngine):
+    """The Google Web Speech API through SpeechRecognition (needs network access)"""
+
+    name = 'google'
+
+    def transcribe(self, samples):
+        import speech_recognition as sr
+        audio = sr.AudioData(samples.tobytes(), SAMPLE_RATE, 2)
+        try:
+            return sr.Recognizer().recognize_google(audio)
+        except sr.UnknownValueError:
+            return ''
+        except sr.RequestError as e:
+            raise SpeechServiceError(f'Speech recognition service error: {str(e)}')
+
+
+class WhisperSTT(STTEngine):
+    """Offline transcription with faster-whisper on the CPU.
+
+    One model instance is loaded once and shared; ``num_workers`` lets that
+    many transcriptions run on it concurrently.
+    """
+
+    name = 'whisper'
+
+    def __init__(self, model_size='base.en', device='cpu', compute_type='int8', num_workers=2, cpu_threads=0,
+                 language='en', download_root=None):
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.num_workers = num_workers
+        self.cpu_threads = cpu_threads
+        self.language = language
+        self.download_root = download_root
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                from faster_whisper import WhisperModel
+                start = time.perf_counter()
+                self._model = WhisperModel(
+                    self.model_size,
+                    device=self.device,
+                    compute_type=self.compute_type,
+                    num_workers=self.num_workers,
+                    cpu_threads=self.cpu_threads,
+                    download_root=self.download_root
+                )
+                logger.info(f"Loaded whisper model '{self.model_size}' in {time.perf_counter() - start:.1f}s")
+        return self._model
+
+    def transcribe(self, samples):
+        model = self.load()
+        audio = samples.astype(np.float32) / 32768.0
+        segments, _ = model.transcribe(audio, language=self.language, beam_size=1, vad_filter=True)
+        return ' '.join(segment.text.strip() for segment in segments).strip()
+
+
+def create_engine(backend, **options):
+    """Build the configured STT engine"""
+    if backend == 'google':
+        return GoogleSTT()
+    if backend == 'whisper':
+        return WhisperSTT(**options)
+    raise ValueError(f'Unknown speech-to-text backend: {backend}')
+
+
+class SpeechToText:
+    """Decodes recordings in memory and transcribes them chunk by chunk on a worker pool.
+
+    Long recordings are split at quiet points into ``chunk_seconds`` pieces
+    that are transcribed in parallel; ``stream`` yields each chunk's text in
+    order as soon as it is ready.
+    """
+
+    def __init__(self, engine, max_workers=2, chunk_seconds=30):
+        self.engine = engine
+        self.chunk_seconds = chunk_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stt')
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'chunks': 0, 'audio_seconds': 0.0, 'transcribe_seconds': 0.0}
+
+    def _transcribe_chunk(self, samples):
+        start = time.perf_counter()
+        text = self.engine.transcribe(samples)
+        with self._lock:
+            self._stats['chunks'] += 1
+            self._stats['transcribe_seconds'] += time.perf_counter() - start
+        return text
+
+    def stream(self, data):
+        """Yield the transcript of each chunk of a recording, in order"""
+        samples = decode_audio(data)
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['audio_seconds'] += len(samples) / SAMPLE_RATE
+        futures = [self.executor.submit(self._transcribe_chunk, chunk)
+                   for chunk in split_audio(samples, self.chunk_seconds) if len(chunk)]
+        try:
+            for future in futures:
+                text = future.result()
+                if text:
+                    yield text
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def transcribe(self, data):
+        """Transcribe a whole recording; raises NoSpeechDetected when nothing was recognized"""
+        text = ' '.join(self.stream(data)).strip()
+        if not text:
+            raise NoSpeechDetected()
+        return text
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                backend=self.engine.name,
+                real_time_factor=round(self._stats['transcribe_seconds'] / self._stats['audio_seconds'], 3)
+                if self._stats['audio_seconds'] else None
+            )
@@ -0,0 +1,285 @@
+import logging
+import math
+import re
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Metadata keys written by the ingestion pipeline rather than taken from CSV columns
+RESERVED_KEYS = ('source', 'row', 'record_type')
+ROW_RECORD = 'row'
+# Chroma stores integer metadata as 64-bit ints
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+AGGREGATE_PATTERNS = (
+    ('count', re.compile(r'\bhow many\b|\bcount\b|\bnumber of\b', re.IGNORECASE)),
+    ('avg', re.compile(r'\baverage\b|\bavg\b|\bmean\b', re.IGNORECASE)),
+    ('max', re.compile(r'\bmax(imum)?\b|\bhighest\b|\bmost\b|\btop\b|\bbest\b', re.IGNORECASE)),
+    ('min', re.compile(r'\bmin(imum)?\b|\blowest\b|\bleast\b|\bfewest\b', re.IGNORECASE)),
+    ('sum', re.compile(r'\btotal\b|\bsum\b|\bcombined\b|\baltogether\b', re.IGNORECASE)),
+)
+
+
+FILTER_OPERATORS = ('$eq', '$ne', '$in', '$nin', '$gt', '$gte', '$lt', '$lte')
+
+
+def is_scalar(value):
+    return isinstance(value, (str, int, float, bool))
+
+
+def validate_filters(filters):
+    """Raise ValueError unless ``filters`` is ``{column: value | [values] | {op: value}}`` with supported operators"""
+    if not isinstance(filters, dict):
+        raise ValueError('filters must be an object of column: value pairs')
+    for column, condition in filters.items():
+        if column.startswith('$'):
+            raise ValueError(f'Unsupported filter column: {column}')
+        if isinstance(condition, dict):
+            if not condition:
+                raise ValueError(f'Empty filter condition for {column}')
+            for op, operand in condition.items():
+                if op not in FILTER_OPERATORS:
+                    raise ValueError(f'Unsupported filter operator: {op}')
+                if op in ('$in', '$nin'):
+                    if not isinstance(operand, list) or not operand or not all(is_scalar(value) for value in operand):
+                        raise ValueError(f'{op} on {column} needs a non-empty list of values')
+                elif op in ('$gt', '$gte', '$lt', '$lte'):
+                    if isinstance(operand, bool) or not isinstance(operand, (int, float)):
+                        raise ValueError(f'{op} on {column} needs a number')
+                elif not is_scalar(operand):
+                    raise ValueError(f'{op} on {column} needs a single value')
+        elif isinstance(condition, list):
+            if not condition or not all(is_scalar(value) for value in condition):
+                raise ValueError(f'Filter on {column} needs a non-empty list of values')
+        elif not is_scalar(condition):
+            raise ValueError(f'Filter on {column} needs a value, a list of values or an operator object')
+
+
+def coerce(value):
+    """Typed metadata value for a CSV cell: int, float or stripped string ('' stays '').
+
+    A cell is only typed when that loses nothing: zip codes like '02134', ids
+    too long for a 64-bit int, '1e5', 'nan' and 'inf' stay strings.
+    """
+    value = value.strip()
+    for cast in (int, float):
+        try:
+            typed = cast(value)
+        except ValueError:
+            continue
+        if str(typed) != value or not math.isfinite(typed):
+            return value
+        if cast is int and not INT64_MIN <= typed <= INT64_MAX:
+            return value
+        return typed
+    return value
+
+
+def build_where(filters):
+    """Turn ``{column: value | [values] | {op: value}}`` into a Chroma ``where`` clause"""
+    clauses = []
+    for column, value in (filters or {}).items():
+        if isinstance(value, (list, tuple)):
+            value = {'$in': list(value)} if len(value) != 1 else value[0]
+        clauses.append({column: value})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def matches(values, condition):
+    """Boolean mask of ``values`` satisfying a scalar or ``{op: value}`` condition"""
+    if not isinstance(condition, dict):
+        return values == condition
+    mask = np.ones(len(values), dtype=bool)
+    for op, operand in condition.items():
+        if op == '$eq':
+            mask &= values == operand
+        elif op == '$ne':
+            mask &= values != operand
+        elif op == '$in':
+            mask &= np.isin(values, list(operand))
+        elif op == '$nin':
+            mask &= ~np.isin(values, list(operand))
+        elif op in ('$gt', '$gte', '$lt', '$lte'):
+            if values.dtype.kind in 'if':
+                mask &= {'$gt': values > operand, '$gte': values >= operand,
+                         '$lt': values < operand, '$lte': values <= operand}[op]
+            else:
+                # Like Chroma, range operators never match text values
+                mask[:] = False
+        else:
+            raise ValueError(f'Unsupported filter operator: {op}')
+    return mask
+
+
+class Table:
+    """Rows of one CSV source held column by column"""
+
+    def __init__(self, source):
+        self.source = source
+        self.rows = 0
+        self._cells = defaultdict(dict)
+        self.columns = {}
+
+    def add(self, row, metadata):
+        for column, value in metadata.items():
+            if column not in RESERVED_KEYS:
+                self._cells[column][row] = value
+        self.rows = max(self.rows, row + 1)
+
+    def freeze(self, keep_values, max_distinct):
+        """Convert collected cells to numpy columns (or just their distinct values)"""
+        for column, cells in self._cells.items():
+            values = [cells.get(row) for row in range(self.rows)]
+            present = [value for value in values if value is not None and value != '']
+            numeric = bool(present) and all(isinstance(value, (int, float)) and not isinstance(value, bool)
+                                            for value in present)
+            if numeric:
+                array = np.array([value if isinstance(value, (int, float)) else np.nan for value in values],
+                                 dtype=np.float64)
+            else:
+                array = np.array(['' if value is None else str(value) for value in values], dtype=object)
+            distinct = set(present)
+            self.columns[column] = {
+                'numeric': numeric,
+                'values': array if keep_values else None,
+                'distinct': distinct if len(distinct) <= max_distinct else None
+            }
+        self._cells = None
+
+    def label(self, row, limit=3):
+        """Short description of a row from its first few text columns"""
+        parts = []
+        for column, info in self.columns.items():
+            if info['numeric'] or info['values'] is None:
+                continue
+            value = info['values'][row]
+            if value and len(value) <= 40:
+                parts.append(f'{column}={value}')
+            if len(parts) >= limit:
+                break
+        return ', '.join(parts)
+
+    def mask(self, where):
+        """Rows matching simple per-column filters, or None if a filter does not apply to this table"""
+        mask = np.ones(self.rows, dtype=bool)
+        for column, condition in (where or {}).items():
+            info = self.columns.get(column)
+            if info is None or info['values'] is None:
+                return None
+            mask &= matches(info['values'], condition)
+        return mask
+
+
+class TableCatalog:
+    """Schema, distinct values and (optionally) columnar copies of the CSV rows in each collection.
+
+    Built lazily from the row metadata stored in Chroma and dropped when a
+    collection is re-ingested. The distinct values of low-cardinality columns
+    are used to turn mentions in a question ("MI", "2025") into ``where``
+    filters; with ``columnar`` enabled the full columns are kept in numpy
+    arrays so sums, counts and averages are computed without the LLM.
+    """
+
+    def __init__(self, registry, columnar=False, max_distinct=1000):
+        self.registry = registry
+        self.columnar = columnar
+        self.max_distinct = max_distinct
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def tables(self, collection_name):
+        with self._lock:
+            tables = self._tables.get(collection_name)
+            if tables is not None:
+                return tables
+            tables = {}
+            collection = self.registry.get_collection(collection_name)
+            offset = 0
+            while True:
+                page = collection.get(where={'record_type': ROW_RECORD}, include=['metadatas'], limit=1000, offset=offset)
+                if not page['ids']:
+                    break
+                for metadata in page['metadatas']:
+                    source = metadata.get('source', '')
+                    tables.setdefault(source, Table(source)).add(int(metadata.get('row', 0)), metadata)
+                offset += len(page['ids'])
+            for table in tables.values():
+                table.freeze(self.columnar, self.max_distinct)
+            if tables:
+                logger.info(f"Loaded {offset} table rows from {len(tables)} sources in '{collection_name}'")
+            self._tables[collection_name] = tables
+            return tables
+
+    def invalidate(self, collection_name=None):
+        with self._lock:
+            if collection_name is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(collection_name, None)
+
+    def filters_from_question(self, collection_name, question):
+        """``{column: value or [values]}`` for known column values mentioned in the question"""
+        filters = {}
+        words = {word.strip('.') for word in re.findall(r'[\w.]+', question.lower())}
+        for table in self.tables(collection_name).values():
+            for column, info in table.columns.items():
+                if not info['distinct']:
+                    continue
+                found = []
+                for value in info['distinct']:
+                    text = str(value).lower()
+                    if len(text) < 2:
+                        continue
+                    # Multi-word values ("Virat Kohli") are matched as phrases, single words as whole words
+                    if (' ' in text and re.search(rf'\b{re.escape(text)}\b', question.lower())) or text in words:
+                        found.append(value)
+                if found:
+                    existing = filters.get(column, [])
+                    filters[column] = sorted(set(existing) | set(found), key=str)
+        return {column: values[0] if len(values) == 1 else values for column, values in filters.items()}
+
+    def aggregate(self, collection_name, question, filters):
+        """Describe aggregates the question asks for over the filtered rows, or return None.
+
+        Needs the columnar cache; numeric columns named in the question are
+        summarised with the operation its wording implies (total, average, ...).
+        """
+        if not self.columnar:
+            return None
+        operations = [name for name, pattern in AGGREGATE_PATTERNS if pattern.search(question)]
+        if not operations:
+            return None
+        lowered = question.lower()
+        where = {column: ({'$in': value} if isinstance(value, list) else value) for column, value in (filters or {}).items()}
+        condition = ', '.join(f'{column} = {value}' for column, value in (filters or {}).items()) or 'all rows'
+        lines = []
+        for table in self.tables(collection_name).values():
+            mask = table.mask(where)
+            if mask is None:
+                continue
+            selected = int(mask.sum())
+            if 'count' in operations:
+                lines.append(f'{table.source}: {selected} rows where {condition}')
+            for column, info in table.columns.items():
+                if not info['numeric'] or not re.search(rf'\b{re.escape(column.lower())}\b', lowered):
+                    continue
+                rows = np.flatnonzero(mask & ~np.isnan(info['values']))
+                if not len(rows):
+                    continue
+                values = info['values'][rows]
+                results = {'sum': values.sum(), 'avg': values.mean(), 'max': values.max(), 'min': values.min()}
+                extremes = {'max': rows[values.argmax()], 'min': rows[values.argmin()]}
+                for operation in operations:
+                    if operation not in results:
+                        continue
+                    line = (f'{table.source}: {operation} of {column} where {condition} = '
+                            f'{results[operation]:g} (over {len(values)} rows)')
+                    if operation in extremes:
+                        line += f' at {table.label(extremes[operation])}'
+                    lines.append(line)
+        return '\n'.join(lines) or None
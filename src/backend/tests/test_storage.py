@@ -0,0 +1,53 @@
+import pytest
+
+from storage import MemoryStore, RedisStore, SessionStore, SQLiteStore
+
+NAMESPACES = {
+    'context': {'ttl': 60, 'max_entries': 100},
+    'idempotency': {'ttl': 60, 'max_entries': 100}
+}
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStore(NAMESPACES)
+    if request.param == 'sqlite':
+        return SQLiteStore(NAMESPACES, str(tmp_path / 'sessions.db'))
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisStore(NAMESPACES, client=fakeredis.FakeRedis())
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore(NAMESPACES)
+
+
+def test_round_trip(store):
+    store.set_many({'context:a': {'memory': [1, 2]}, 'idempotency:k': {'status_code': 200}})
+    assert store.get_many(['context:a', 'idempotency:k', 'context:missing']) == {
+        'context:a': {'memory': [1, 2]},
+        'idempotency:k': {'status_code': 200}
+    }
+    assert store.get('context:missing', 'default') == 'default'
+
+
+def test_delete(store):
+    store.set('context:a', {'memory': []})
+    store.delete('context:a')
+    assert store.get('context:a') is None
+
+
+def test_stats_count_entries_per_namespace(store):
+    store.set_many({'context:a': {}, 'context:b': {}, 'idempotency:k': {}})
+    stats = store.stats()
+    assert stats['context']['entries'] == 2
+    assert stats['idempotency']['entries'] == 1
+
+
+def test_redis_applies_namespace_ttl():
+    fakeredis = pytest.importorskip('fakeredis')
+    client = fakeredis.FakeRedis()
+    store = RedisStore({'context': {'ttl': 30}}, client=client)
+    store.set('context:a', {'memory': []})
+    assert 0 < client.ttl('context:a') <= 30
@@ -0,0 +1,43 @@
+import pytest
+
+from tables import Table, coerce, validate_filters
+
+
+@pytest.fixture
+def table():
+    table = Table('scores.csv')
+    table.add(0, {'team': 'MI', 'runs': 180, 'source': 'scores.csv', 'row': 0})
+    table.add(1, {'team': 'GT', 'runs': 150, 'source': 'scores.csv', 'row': 1})
+    table.freeze(keep_values=True, max_distinct=100)
+    return table
+
+
+def test_validate_filters_rejects_unknown_operator():
+    with pytest.raises(ValueError):
+        validate_filters({'team': {'$regex': 'M.*'}})
+
+
+def test_range_filter_on_numeric_column(table):
+    assert table.mask({'runs': {'$gt': 160}}).tolist() == [True, False]
+
+
+def test_range_filter_on_text_column_matches_nothing(table):
+    # Valid as far as validate_filters can tell, so it must not fail later on
+    validate_filters({'team': {'$gt': 5}})
+    assert table.mask({'team': {'$gt': 5}}).tolist() == [False, False]
+
+
+@pytest.mark.parametrize('cell, expected', [
+    ('42', 42),
+    (' 3.5 ', 3.5),
+    ('MI', 'MI'),
+    ('', ''),
+    ('02134', '02134'),
+    ('12345678901234567890123', '12345678901234567890123'),
+    ('1e5', '1e5'),
+    ('nan', 'nan'),
+    ('inf', 'inf'),
+])
+def test_coerce_only_types_cells_without_loss(cell, expected):
+    value = coerce(cell)
+    assert value == expected and type(value) is type(expected)
@@ -0,0 +1,155 @@
+import logging
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value):
+    """Approximate in-memory footprint of a value in bytes"""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class TTLStore:
+    """Thread-safe key/value store with a fixed TTL and LRU size caps.
+
+    Every entry lives for ``ttl`` seconds after its last write. Because the TTL
+    is the same for all keys, write order is expiry order, so expired keys are
+    popped from the front of an ordered dict in amortized O(1) by ``sweep``,
+    which a background thread runs every ``sweep_interval`` seconds. Reads
+    never return expired entries even between sweeps. When ``max_entries`` or
+    ``max_bytes`` is exceeded the least recently used entries are evicted.
+    """
+
+    def __init__(self, ttl, max_entries=None, max_bytes=None, sweep_interval=None, name='store'):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.name = name
+        self._values = {}
+        self._expiry = OrderedDict()
+        self._lru = OrderedDict()
+        self._bytes = 0
+        self._stats = {'evictions': 0, 'expirations': 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper = None
+        if sweep_interval:
+            self.start_sweeper(sweep_interval)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._live(key, time.monotonic())
+
+    def __getitem__(self, key):
+        with self._lock:
+            if not self._live(key, time.monotonic()):
+                raise KeyError(key)
+            self._lru.move_to_end(key)
+            return self._values[key]
+
+    def __setitem__(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._values:
+                self._remove(key)
+            self._values[key] = value
+            self._expiry[key] = time.monotonic() + self.ttl
+            self._lru[key] = size
+            self._bytes += size
+            self._enforce_caps()
+
+    def __delitem__(self, key):
+        with self._lock:
+            if key not in self._values:
+                raise KeyError(key)
+            self._remove(key)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._values)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if not self._live(key, time.monotonic()):
+                return default
+            value = self._values[key]
+            self._remove(key)
+            return value
+
+    def sweep(self):
+        """Drop every expired entry and return how many were removed"""
+        removed = 0
+        now = time.monotonic()
+        with self._lock:
+            while self._expiry:
+                key, expires_at = next(iter(self._expiry.items()))
+                if expires_at > now:
+                    break
+                self._remove(key)
+                removed += 1
+            self._stats['expirations'] += removed
+        return removed
+
+    def start_sweeper(self, interval):
+        """Run ``sweep`` every ``interval`` seconds on a daemon thread"""
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    removed = self.sweep()
+                    if removed:
+                        logger.info(f"Expired {removed} entries from {self.name}")
+                except Exception as e:
+                    logger.error(f"Error sweeping {self.name}: {str(e)}")
+
+        self._sweeper = threading.Thread(target=run, name=f'{self.name}-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def stats(self):
+        """Current size gauges and eviction counters"""
+        with self._lock:
+            return dict(self._stats, entries=len(self._values), bytes=self._bytes,
+                        max_entries=self.max_entries, max_bytes=self.max_bytes)
+
+    def _live(self, key, now):
+        # Expired entries are removed lazily on access as well as by the sweeper
+        expires_at = self._expiry.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= now:
+            self._remove(key)
+            self._stats['expirations'] += 1
+            return False
+        return True
+
+    def _remove(self, key):
+        del self._values[key]
+        del self._expiry[key]
+        self._bytes -= self._lru.pop(key)
+
+    def _enforce_caps(self):
+        while self._lru and (
+            (self.max_entries is not None and len(self._values) > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._lru))
+            self._remove(key)
+            self._stats['evictions'] += 1
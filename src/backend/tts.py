@@ -0,0 +1,252 @@
+import hashlib
+import io
+import logging
+import re
+import struct
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?;:])\s+|\n+')
+# RIFF/data sizes for a WAV stream whose length is not known up front
+STREAMING_WAV_SIZE = 0xFFFFFFFF
+
+
+class SpeechSynthesisError(Exception):
+    """Raised when the TTS engine fails to synthesize a sentence"""
+
+
+def split_sentences(text, max_chars=300):
+    """Split text into sentences, breaking overly long ones at word boundaries"""
+    sentences = []
+    for sentence in SENTENCE_PATTERN.split(text):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            sentences.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+def parse_wav(data):
+    """``(fmt, pcm)`` of a WAV clip: the raw fmt chunk and the sample data after the data chunk header.
+
+    Chunk sizes are not trusted for the data chunk, since tools writing WAV to a
+    pipe cannot seek back to fill them in.
+    """
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise SpeechSynthesisError('TTS engine did not return WAV audio')
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(data):
+        chunk, size = data[offset:offset + 4], struct.unpack('<I', data[offset + 4:offset + 8])[0]
+        if chunk == b'data':
+            return fmt, data[offset + 8:]
+        if chunk == b'fmt ':
+            fmt = data[offset + 8:offset + 8 + size]
+        offset += 8 + size + (size & 1)
+    raise SpeechSynthesisError('WAV audio has no data chunk')
+
+
+def streaming_wav_header(fmt):
+    """WAV header for a stream of unknown length with the given fmt chunk"""
+    return (b'RIFF' + struct.pack('<I', STREAMING_WAV_SIZE) + b'WAVE' +
+            b'fmt ' + struct.pack('<I', len(fmt)) + fmt +
+            b'data' + struct.pack('<I', STREAMING_WAV_SIZE))
+
+
+class TTSEngine(ABC):
+    """Synthesizes one sentence to a self-contained audio clip"""
+
+    name = None
+    mimetype = None
+
+    def cache_key(self, text):
+        return hashlib.sha256(f'{self.name}\x1f{text}'.encode('utf-8')).hexdigest()
+
+    @abstractmethod
+    def synthesize(self, text):
+        """Return the audio clip for one sentence as bytes of ``mimetype``"""
+
+    def stream(self, clips):
+        """Yield the bytes of one continuous audio stream made of ``clips``"""
+        # MP3 frames are self-delimiting, so clips can simply be concatenated
+        yield from clips
+
+
+class EspeakTTS(TTSEngine):
+    """Offline synthesis with the espeak (or espeak-ng) command line tool"""
+
+    name = 'espeak'
+    mimetype = 'audio/wav'
+
+    def __init__(self, binary='espeak', voice='en', rate=170):
+        self.binary = binary
+        self.voice = voice
+        self.rate = rate
+
+    def cache_key(self, text):
+        return hashlib.sha256(f'{self.name}\x1f{self.voice}\x1f{self.rate}\x1f{text}'.encode('utf-8')).hexdigest()
+
+    def synthesize(self, text):
+        try:
+            result = subprocess.run(
+                [self.binary, '--stdout', '--stdin', '-v', self.voice, '-s', str(self.rate)],
+                input=text.encode('utf-8'), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+            )
+        except FileNotFoundError:
+            raise SpeechSynthesisError(f'{self.binary} is not installed')
+        except subprocess.CalledProcessError as e:
+            raise SpeechSynthesisError(f"{self.binary} failed: {e.stderr.decode('utf-8', 'replace').strip()}")
+        return result.stdout
+
+    def stream(self, clips):
+        """One WAV header taken from the first clip, then the samples of every clip"""
+        header_sent = False
+        for clip in clips:
+            fmt, pcm = parse_wav(clip)
+            if not header_sent:
+                yield streaming_wav_header(fmt)
+                header_sent = True
+            yield pcm
+
+
+class GoogleTTS(TTSEngine):
+    """gTTS (Google Translate's TTS endpoint, needs network access); returns MP3"""
+
+    name = 'gtts'
+    mimetype = 'audio/mpeg'
+
+    def __init__(self, lang='en'):
+        self.lang = lang
+
+    def cache_key(self, text):
+        return hashlib.sha256(f'{self.name}\x1f{self.lang}\x1f{text}'.encode('utf-8')).hexdigest()
+
+    def synthesize(self, text):
+        from gtts import gTTS
+        buffer = io.BytesIO()
+        try:
+            gTTS(text=text, lang=self.lang, slow=False).write_to_fp(buffer)
+        except Exception as e:
+            raise SpeechSynthesisError(f'gTTS failed: {str(e)}')
+        return buffer.getvalue()
+
+
+def create_engine(backend, **options):
+    """Build the configured TTS engine"""
+    if backend == 'espeak':
+        return EspeakTTS(**options)
+    if backend == 'gtts':
+        return GoogleTTS(**options)
+    raise ValueError(f'Unknown text-to-speech backend: {backend}')
+
+
+class ClipCache:
+    """LRU cache of synthesized sentence clips keyed by a hash of engine, voice and text"""
+
+    def __init__(self, max_entries=2000, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clips = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is None:
+                self._stats['misses'] += 1
+                return None
+            self._clips.move_to_end(key)
+            self._stats['hits'] += 1
+            return clip
+
+    def set(self, key, clip):
+        if len(clip) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._clips.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._clips[key] = clip
+            self._bytes += len(clip)
+            while len(self._clips) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._clips.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(
+                self._stats,
+                entries=len(self._clips),
+                bytes=self._bytes,
+                hit_ratio=round(self._stats['hits'] / lookups, 3) if lookups else 0.0
+            )
+
+
+class TextToSpeech:
+    """Synthesizes text sentence by sentence on a worker pool and streams the audio.
+
+    All sentences are submitted at once so later ones are synthesized while
+    the first is already being sent; clips are yielded in order and cached,
+    so replaying an answer (or any repeated sentence) costs no synthesis.
+    """
+
+    def __init__(self, engine, cache, max_workers=2, max_sentence_chars=300):
+        self.engine = engine
+        self.cache = cache
+        self.max_sentence_chars = max_sentence_chars
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tts')
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'sentences': 0, 'synthesis_seconds': 0.0}
+
+    @property
+    def mimetype(self):
+        return self.engine.mimetype
+
+    def clip(self, sentence):
+        """The cached or freshly synthesized clip for one sentence"""
+        key = self.engine.cache_key(sentence)
+        clip = self.cache.get(key)
+        if clip is not None:
+            return clip
+        start = time.perf_counter()
+        clip = self.engine.synthesize(sentence)
+        with self._lock:
+            self._stats['sentences'] += 1
+            self._stats['synthesis_seconds'] += time.perf_counter() - start
+        self.cache.set(key, clip)
+        return clip
+
+    def _clips(self, sentences):
+        futures = [self.executor.submit(self.clip, sentence) for sentence in sentences]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def stream(self, text):
+        """Yield the audio for ``text`` as it is synthesized"""
+        sentences = split_sentences(text, self.max_sentence_chars)
+        with self._lock:
+            self._stats['requests'] += 1
+        return self.engine.stream(self._clips(sentences))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, backend=self.engine.name, clip_cache=self.cache.stats())
@@ -0,0 +1,110 @@
+import logging
+import threading
+
+from embedding_cache import CachedEmbeddings
+from scheduler import EmbeddingBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreRegistry:
+    """Process-wide cache of Chroma collections keyed by collection name.
+
+    The Chroma client and the embedding function are created once and shared by
+    every collection; the per-collection handles are opened lazily on first use
+    and dropped again when ``invalidate`` is called after a write. chromadb and
+    the Ollama integration are imported on first use too, so they do not slow
+    down process start.
+    """
+
+    def __init__(self, db_path, ollama_base_url, embedding_model, embedding_cache_dir=None,
+                 embedding_cache_entries=10000, embedding_cache_disk_entries=100000, embed_batch_window=0.0,
+                 embed_batch_max=64, timeout=None):
+        self.db_path = db_path
+        self.ollama_base_url = ollama_base_url
+        self.embedding_model = embedding_model
+        self.embedding_cache_dir = embedding_cache_dir
+        self.embedding_cache_entries = embedding_cache_entries
+        self.embedding_cache_disk_entries = embedding_cache_disk_entries
+        self.embed_batch_window = embed_batch_window
+        self.embed_batch_max = embed_batch_max
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._client = None
+        self._embeddings = None
+        self._batcher = None
+        self._collections = {}
+        self._stats = {'warm_hits': 0, 'cold_hits': 0, 'invalidations': 0}
+
+    @property
+    def client(self):
+        """Shared chromadb PersistentClient, opened on first access"""
+        with self._lock:
+            return self._get_client()
+
+    @property
+    def embeddings(self):
+        """Shared embedding function, created on first access"""
+        with self._lock:
+            return self._get_embeddings()
+
+    def _get_client(self):
+        if self._client is None:
+            import chromadb
+            self._client = chromadb.PersistentClient(path=self.db_path)
+        return self._client
+
+    def _get_embeddings(self):
+        if self._embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+            embeddings = OllamaEmbeddings(
+                base_url=self.ollama_base_url,
+                model=self.embedding_model,
+                client_kwargs={'timeout': self.timeout}
+            )
+            if self.embed_batch_window > 0:
+                # Cache misses from concurrent retrievals are sent to Ollama in one batch
+                self._batcher = embeddings = EmbeddingBatcher(
+                    embeddings, max_batch=self.embed_batch_max, window=self.embed_batch_window, timeout=self.timeout)
+            # Queries and ingested chunks share one cache keyed by (model, text hash)
+            self._embeddings = CachedEmbeddings(
+                embeddings,
+                self.embedding_model,
+                cache_dir=self.embedding_cache_dir,
+                max_memory_entries=self.embedding_cache_entries,
+                max_disk_entries=self.embedding_cache_disk_entries
+            )
+        return self._embeddings
+
+    def get_collection(self, collection_name):
+        """Return the cached raw chromadb collection, creating it if needed"""
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is not None:
+                self._stats['warm_hits'] += 1
+                return collection
+
+            self._stats['cold_hits'] += 1
+            logger.info(f"Opening collection '{collection_name}'")
+            collection = self._get_client().get_or_create_collection(collection_name)
+            self._collections[collection_name] = collection
+            return collection
+
+    def invalidate(self, collection_name=None):
+        """Drop the cached handle for a collection, or all of them if no name is given"""
+        with self._lock:
+            if collection_name is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(collection_name, None)
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        """Warm/cold hit counters and the collections currently cached"""
+        with self._lock:
+            return dict(
+                self._stats,
+                cached_collections=sorted(self._collections),
+                embedding_cache=self._embeddings.stats() if self._embeddings is not None else None,
+                embedding_batches=self._batcher.stats() if self._batcher is not None else None
+            )
@@ -0,0 +1,307 @@
+"""Load generator for the backend's chat, streaming chat and RAG endpoints.
+
+Runs a workload with N concurrent sessions and reports p50/p95/p99 latency,
+requests/sec and the backend's memory growth (read from /api/v1/metrics):
+
+    python bench.py --url http://localhost:8000 --scenario chat --concurrency 16 --requests 400
+    python bench.py --scenario stream --duration 60 --output results.json
+    python bench.py --scenario chat --baseline results.json --max-regression 0.15
+
+With ``--baseline`` the run exits non-zero when p95 latency or throughput is
+worse than the baseline by more than ``--max-regression``.
+"""
+import argparse
+import io
+import json
+import logging
+import math
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+QUESTIONS = (
+    'What is the weather like in Texas?',
+    'Summarize the uploaded document.',
+    'Which products sold best last quarter?',
+    'Explain retrieval augmented generation in one paragraph.',
+    'What did I ask you before?',
+    'List three facts from the data.',
+    'How many rows are in the dataset?',
+    'Who is the author of the report?'
+)
+
+JOB_FINISHED_STATES = ('completed', 'failed', 'cancelled')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None for an empty list)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def backend_rss(session, url):
+    """Resident memory of the backend as published on /api/v1/metrics, or None"""
+    try:
+        response = session.get(f'{url}/api/v1/metrics', timeout=10)
+        for line in response.text.splitlines():
+            if line.startswith('process_resident_memory_bytes'):
+                return float(line.split()[-1])
+    except requests.RequestException:
+        pass
+    return None
+
+
+def sample_csv(rows):
+    """Synthetic CSV upload for the rag scenario"""
+    lines = ['id,region,product,units,notes']
+    for i in range(rows):
+        lines.append(f'{i},region-{i % 7},product-{i % 23},{(i * 37) % 500},note {uuid.uuid4().hex}')
+    return '\n'.join(lines).encode('utf-8')
+
+
+class Workload:
+    """One benchmark scenario; ``run_once`` returns a sample dict for a single request"""
+
+    def __init__(self, options):
+        self.options = options
+        self.url = options.url.rstrip('/')
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def next_question(self):
+        with self.lock:
+            self.counter += 1
+            n = self.counter
+        question = QUESTIONS[n % len(QUESTIONS)]
+        # A unique suffix defeats the response cache unless cache hits are what is being measured
+        return question if self.options.allow_cache_hits else f'{question} (#{n})'
+
+    def headers(self, session_id):
+        return {'Content-Type': 'application/json', 'X-Session-ID': session_id}
+
+
+class ChatWorkload(Workload):
+    def run_once(self, http, session_id):
+        start = time.perf_counter()
+        response = http.post(f'{self.url}/api/v1/chat', headers=self.headers(session_id),
+                             json=self.payload(), timeout=self.options.timeout)
+        return {'latency': time.perf_counter() - start, 'ok': response.status_code == 200,
+                'status': response.status_code}
+
+    def payload(self):
+        payload = {'question': self.next_question()}
+        if self.options.collection:
+            payload['collection_name'] = self.options.collection
+        return payload
+
+
+class StreamWorkload(ChatWorkload):
+    def run_once(self, http, session_id):
+        start = time.perf_counter()
+        first_token = None
+        ok = False
+        with http.post(f'{self.url}/api/v1/chat/stream', headers=self.headers(session_id), json=self.payload(),
+                       timeout=self.options.timeout, stream=True) as response:
+            status = response.status_code
+            for line in response.iter_lines(decode_unicode=True):
+                if line == 'event: token' and first_token is None:
+                    first_token = time.perf_counter()
+                elif line == 'event: done':
+                    ok = status == 200
+                elif line == 'event: error':
+                    break
+        return {'latency': time.perf_counter() - start, 'ok': ok, 'status': status,
+                'ttft': first_token - start if first_token else None}
+
+
+class RagWorkload(Workload):
+    def run_once(self, http, session_id):
+        start = time.perf_counter()
+        files = {'file': (f'bench-{uuid.uuid4().hex}.csv', io.BytesIO(sample_csv(self.options.rag_rows)), 'text/csv')}
+        response = http.post(f'{self.url}/api/v1/rag', files=files, timeout=self.options.timeout)
+        accepted = time.perf_counter()
+        if response.status_code != 202:
+            return {'latency': accepted - start, 'ok': False, 'status': response.status_code}
+        job_id = response.json()['job_id']
+        while True:
+            job = http.get(f'{self.url}/api/v1/rag/jobs/{job_id}', timeout=self.options.timeout).json()['job']
+            if job['status'] in JOB_FINISHED_STATES:
+                break
+            if time.perf_counter() - start > self.options.timeout:
+                return {'latency': time.perf_counter() - start, 'ok': False, 'status': 'timeout'}
+            time.sleep(0.2)
+        return {'latency': time.perf_counter() - start, 'ok': job['status'] == 'completed', 'status': job['status'],
+                'accept': accepted - start}
+
+
+WORKLOADS = {'chat': ChatWorkload, 'stream': StreamWorkload, 'rag': RagWorkload}
+
+
+def run_workload(options):
+    workload = WORKLOADS[options.scenario](options)
+    samples = []
+    samples_lock = threading.Lock()
+    deadline = time.perf_counter() + options.duration if options.duration else None
+    remaining = {'requests': options.requests}
+
+    def take_request():
+        with samples_lock:
+            if deadline is not None:
+                return time.perf_counter() < deadline
+            if remaining['requests'] <= 0:
+                return False
+            remaining['requests'] -= 1
+            return True
+
+    def session_worker(index):
+        # One HTTP connection pool and one chat session per simulated user
+        http = requests.Session()
+        session_id = f'bench-{index}-{uuid.uuid4().hex[:8]}'
+        for _ in range(options.warmup):
+            try:
+                workload.run_once(http, session_id)
+            except requests.RequestException:
+                pass
+        while take_request():
+            try:
+                sample = workload.run_once(http, session_id)
+            except requests.RequestException as e:
+                sample = {'latency': None, 'ok': False, 'status': type(e).__name__}
+            with samples_lock:
+                samples.append(sample)
+
+    monitor = requests.Session()
+    rss_before = backend_rss(monitor, workload.url)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.concurrency) as pool:
+        list(pool.map(session_worker, range(options.concurrency)))
+    elapsed = time.perf_counter() - start
+    rss_after = backend_rss(monitor, workload.url)
+    return summarize(options, samples, elapsed, rss_before, rss_after)
+
+
+def summarize(options, samples, elapsed, rss_before, rss_after):
+    latencies = [sample['latency'] for sample in samples if sample['ok']]
+    report = {
+        'scenario': options.scenario,
+        'concurrency': options.concurrency,
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample['ok']),
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_sec': round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        'latency_ms': latency_summary(latencies),
+        'memory': {
+            'rss_before_bytes': rss_before,
+            'rss_after_bytes': rss_after,
+            'growth_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        }
+    }
+    ttfts = [sample['ttft'] for sample in samples if sample.get('ttft') is not None]
+    if ttfts:
+        report['time_to_first_token_ms'] = latency_summary(ttfts)
+    accepts = [sample['accept'] for sample in samples if sample.get('accept') is not None]
+    if accepts:
+        report['accept_latency_ms'] = latency_summary(accepts)
+    statuses = {}
+    for sample in samples:
+        if not sample['ok']:
+            statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+    if statuses:
+        report['error_statuses'] = statuses
+    return report
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None, 'mean': None}
+    to_ms = lambda value: round(value * 1000, 1)
+    return {
+        'p50': to_ms(percentile(seconds, 50)),
+        'p95': to_ms(percentile(seconds, 95)),
+        'p99': to_ms(percentile(seconds, 99)),
+        'max': to_ms(max(seconds)),
+        'mean': to_ms(sum(seconds) / len(seconds))
+    }
+
+
+def print_report(report):
+    print(f"scenario={report['scenario']} concurrency={report['concurrency']} requests={report['requests']} "
+          f"errors={report['errors']} elapsed={report['elapsed_seconds']}s rps={report['requests_per_sec']}")
+    for name in ('latency_ms', 'time_to_first_token_ms', 'accept_latency_ms'):
+        if name in report:
+            values = report[name]
+            print(f"  {name:<24} p50={values['p50']} p95={values['p95']} p99={values['p99']} "
+                  f"max={values['max']} mean={values['mean']}")
+    memory = report['memory']
+    if memory['growth_bytes'] is not None:
+        print(f"  rss {memory['rss_before_bytes'] / 2**20:.1f} MiB -> {memory['rss_after_bytes'] / 2**20:.1f} MiB "
+              f"(growth {memory['growth_bytes'] / 2**20:+.1f} MiB)")
+    else:
+        print('  rss unavailable (is /api/v1/metrics reachable?)')
+    if 'error_statuses' in report:
+        print(f"  error statuses: {report['error_statuses']}")
+
+
+def compare(report, baseline, max_regression):
+    """Return the regressions of a report against a baseline, as readable strings"""
+    problems = []
+    old_p95, new_p95 = baseline['latency_ms']['p95'], report['latency_ms']['p95']
+    if old_p95 and new_p95 and new_p95 > old_p95 * (1 + max_regression):
+        problems.append(f'p95 latency {new_p95}ms vs baseline {old_p95}ms')
+    old_rps, new_rps = baseline['requests_per_sec'], report['requests_per_sec']
+    if old_rps and new_rps < old_rps * (1 - max_regression):
+        problems.append(f'throughput {new_rps} req/s vs baseline {old_rps} req/s')
+    if report['errors'] > baseline['errors']:
+        problems.append(f"{report['errors']} errors vs baseline {baseline['errors']}")
+    return problems
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the chatbot backend')
+    parser.add_argument('--url', default='http://localhost:8000', help='backend base URL')
+    parser.add_argument('--scenario', choices=sorted(WORKLOADS), default='chat')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent sessions')
+    parser.add_argument('--requests', type=int, default=200, help='total requests (ignored with --duration)')
+    parser.add_argument('--duration', type=float, default=None, help='run for this many seconds instead')
+    parser.add_argument('--warmup', type=int, default=1, help='unmeasured requests per session before the run')
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--collection', default=None, help='collection_name sent with chat questions')
+    parser.add_argument('--allow-cache-hits', action='store_true',
+                        help='repeat questions verbatim so the response cache can answer them')
+    parser.add_argument('--rag-rows', type=int, default=200, help='rows in each uploaded CSV for the rag scenario')
+    parser.add_argument('--output', default=None, help='write the report as JSON to this path')
+    parser.add_argument('--baseline', default=None, help='JSON report to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='allowed relative p95/throughput regression against the baseline')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    options = parse_args(argv)
+    report = run_workload(options)
+    print_report(report)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if options.baseline:
+        with open(options.baseline) as f:
+            problems = compare(report, json.load(f), options.max_regression)
+        for problem in problems:
+            logger.error(f'Regression: {problem}')
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
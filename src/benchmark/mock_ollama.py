@@ -0,0 +1,195 @@
+"""Fake Ollama server for benchmarking the backend without a model.
+
+Serves ``/api/generate``, ``/api/chat``, ``/api/embeddings`` and ``/api/embed``
+with a configurable time-to-first-token, token rate and embedding latency, so
+backend throughput can be measured in isolation:
+
+    python mock_ollama.py --port 11434 --first-token-latency 0.2 --token-rate 50
+    OLLAMA_BASE_URL=http://localhost:11434 python ../backend/main.py
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    'the model answers questions about the uploaded documents using retrieved context and '
+    'the conversation so far while keeping responses short clear and relevant to the user'
+).split()
+
+
+def fake_embedding(text, dim):
+    """Deterministic unit-length vector for a text, so repeated texts embed identically"""
+    rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = sum(value * value for value in vector) ** 0.5 or 1.0
+    return [value / norm for value in vector]
+
+
+def fake_tokens(prompt, count):
+    """Token stream for a prompt; the same prompt always yields the same answer"""
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).digest())
+    return [('' if i == 0 else ' ') + rng.choice(WORDS) for i in range(count)]
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    options = None
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, payload):
+        data = (json.dumps(payload) + '\n').encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.send_json({'models': [{'name': self.options.model, 'model': self.options.model}]})
+        elif self.path == '/api/version':
+            self.send_json({'version': 'mock'})
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        try:
+            data = self.read_json()
+        except ValueError:
+            self.send_json({'error': 'invalid JSON'}, 400)
+            return
+        if self.path == '/api/generate':
+            self.generate(data, data.get('prompt', ''), chat=False)
+        elif self.path == '/api/chat':
+            prompt = '\n'.join(message.get('content', '') for message in data.get('messages', []))
+            self.generate(data, prompt, chat=True)
+        elif self.path == '/api/embeddings':
+            time.sleep(self.options.embed_latency)
+            self.send_json({'embedding': fake_embedding(data.get('prompt', ''), self.options.dim)})
+        elif self.path == '/api/embed':
+            texts = data.get('input', [])
+            texts = [texts] if isinstance(texts, str) else texts
+            time.sleep(self.options.embed_latency * (1 + max(0, len(texts) - 1) / self.options.embed_batch_speedup))
+            self.send_json({
+                'model': data.get('model', self.options.embedding_model),
+                'embeddings': [fake_embedding(text, self.options.dim) for text in texts]
+            })
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def message(self, data, token, chat, done=False):
+        payload = {
+            'model': data.get('model', self.options.model),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'done': done
+        }
+        if chat:
+            payload['message'] = {'role': 'assistant', 'content': token}
+        else:
+            payload['response'] = token
+        return payload
+
+    def generate(self, data, prompt, chat):
+        options = self.options
+        start = time.perf_counter()
+        tokens = fake_tokens(prompt, options.tokens)
+        prompt_tokens = max(1, len(prompt) // 4)
+        time.sleep(options.first_token_latency)
+        eval_start = time.perf_counter()
+
+        def final(answer):
+            payload = self.message(data, answer, chat, done=True)
+            payload.update(
+                done_reason='stop',
+                total_duration=int((time.perf_counter() - start) * 1e9),
+                load_duration=0,
+                prompt_eval_count=prompt_tokens,
+                prompt_eval_duration=int(options.first_token_latency * 1e9),
+                eval_count=len(tokens),
+                eval_duration=max(1, int((time.perf_counter() - eval_start) * 1e9))
+            )
+            return payload
+
+        if not data.get('stream', True):
+            time.sleep(len(tokens) / options.token_rate)
+            self.send_json(final(''.join(tokens)))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(1 / options.token_rate)
+                self.send_chunk(self.message(data, token, chat))
+            self.send_chunk(final(''))
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The backend closed the stream early, as it does when its client disconnects
+            logger.info('Client closed the stream before generation finished')
+            self.close_connection = True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Fake Ollama server with tunable latency for benchmarks')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--model', default='llama3')
+    parser.add_argument('--embedding-model', default='nomic-embed-text')
+    parser.add_argument('--first-token-latency', type=float, default=0.2,
+                        help='seconds before the first generated token')
+    parser.add_argument('--token-rate', type=float, default=50.0, help='generated tokens per second')
+    parser.add_argument('--tokens', type=int, default=64, help='tokens per generated answer')
+    parser.add_argument('--embed-latency', type=float, default=0.01, help='seconds per embedded text')
+    parser.add_argument('--embed-batch-speedup', type=float, default=4.0,
+                        help='how much cheaper each extra text in an /api/embed batch is than the first')
+    parser.add_argument('--dim', type=int, default=768, help='embedding dimension')
+    return parser.parse_args(argv)
+
+
+def serve(options):
+    handler = type('Handler', (MockOllamaHandler,), {'options': options})
+    server = ThreadingHTTPServer((options.host, options.port), handler)
+    server.daemon_threads = True
+    logger.info(f'Mock Ollama listening on {options.host}:{options.port}')
+    return server
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = serve(parse_args(argv))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
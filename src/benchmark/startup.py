@@ -0,0 +1,110 @@
+"""Cold-start benchmark for the backend.
+
+For each run it measures how long ``import main`` takes, then starts
+``python main.py`` and times how long it takes until ``/api/v1/health``
+reports the process live (port open) and ready (warm-up done):
+
+    python startup.py --runs 5 --mode lazy
+    python startup.py --runs 5 --mode eager --output startup.json
+
+Point OLLAMA_BASE_URL at a mock_ollama.py server to time the backend alone.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+IMPORT_PROBE = 'import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)'
+
+
+def wait_for(url, deadline, process):
+    """Poll a URL until it answers 200; return the time it did, or None on timeout or exit"""
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            return None
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def measure_import(options, env):
+    result = subprocess.run([options.python, '-c', IMPORT_PROBE], cwd=options.backend_dir, env=env,
+                            capture_output=True, text=True, timeout=options.timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f'import main failed:\n{result.stderr}')
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_start(options, env):
+    base = f'http://127.0.0.1:{options.port}/api/v1/health'
+    start = time.perf_counter()
+    process = subprocess.Popen([options.python, 'main.py'], cwd=options.backend_dir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + options.timeout
+        live = wait_for(f'{base}?probe=live', deadline, process)
+        ready = wait_for(f'{base}?probe=ready', deadline, process) if live else None
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return (live - start if live else None), (ready - start if ready else None)
+
+
+def summary(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {'median': round(statistics.median(values), 3), 'min': round(min(values), 3), 'max': round(max(values), 3)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Measure backend cold-start time')
+    parser.add_argument('--backend-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+    parser.add_argument('--python', default=sys.executable)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--mode', choices=('lazy', 'eager'), default='lazy', help='STARTUP_MODE for the backend')
+    parser.add_argument('--timeout', type=float, default=120.0, help='seconds to wait for each run')
+    parser.add_argument('--output', default=None, help='write the report as JSON to this path')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    env = dict(os.environ, PORT=str(options.port), STARTUP_MODE=options.mode)
+    runs = []
+    for run in range(options.runs):
+        import_seconds = measure_import(options, env)
+        live, ready = measure_start(options, env)
+        runs.append({'import_seconds': import_seconds, 'live_seconds': live, 'ready_seconds': ready})
+        print(f'run {run + 1}: import={import_seconds:.3f}s live={live if live is None else round(live, 3)}s '
+              f'ready={ready if ready is None else round(ready, 3)}s')
+    report = {
+        'mode': options.mode,
+        'runs': runs,
+        'import_seconds': summary([run['import_seconds'] for run in runs]),
+        'live_seconds': summary([run['live_seconds'] for run in runs]),
+        'ready_seconds': summary([run['ready_seconds'] for run in runs])
+    }
+    print(json.dumps({key: report[key] for key in ('mode', 'import_seconds', 'live_seconds', 'ready_seconds')}, indent=2))
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if all(run['live_seconds'] is not None for run in runs) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
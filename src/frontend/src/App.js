@@ -26,6 +26,9 @@ const API_URL = process.env.NODE_ENV === 'production'
   ? process.env.REACT_APP_API_URL || 'http://localhost:8000'
   : '';
 
+// Longer texts are sent in a POST body instead of the query string
+const MAX_STREAMED_TTS_CHARS = 1500;
+
 // Create axios instance with default config
 const api = axios.create({
   baseURL: API_URL,
@@ -162,6 +165,18 @@ function App() {
     }
   };
 
+  const waitForRagJob = async (jobId) => {
+    // Poll the ingestion job until it reaches a final state
+    for (;;) {
+      const response = await api.get(`/api/v1/rag/jobs/${jobId}`);
+      const job = response.data.job;
+      if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+        return job;
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleRagUpload = async () => {
     if (!ragFile) {
       setError('Please select a file');
@@ -179,9 +194,13 @@ function App() {
       });
 
       if (response.data.status === 'success') {
+        const job = await waitForRagJob(response.data.job_id);
+        if (job.status !== 'completed') {
+          throw new Error(job.errors?.[0] || `RAG ingestion ${job.status}`);
+        }
         setError(null);
         setMessages(prev => [...prev, {
-          text: `RAG data uploaded successfully.`,
+          text: `RAG data uploaded successfully (${job.progress.chunks_embedded} chunks indexed).`,
           sender: 'bot'
         }]);
         setRagFile(null);
@@ -193,6 +212,7 @@ function App() {
       let errorMessage = 'Failed to upload. Please try again.';
       if (error.response) errorMessage = error.response.data?.message || error.response.statusText;
       else if (error.request) errorMessage = 'No response from server. Please check your connection.';
+      else if (error.message) errorMessage = error.message;
       setError(errorMessage);
     } finally {
       setUploading(false);
@@ -327,26 +347,28 @@ function App() {
     setAudioLoadingIndex(index);
     setPlayingIndex(null);
     try {
-      const response = await api.post('/api/v1/voice/text-to-speech', { text });
-      if (response.data.status === 'success') {
-        const audioData = atob(response.data.audio);
-        const audioArray = new Uint8Array(audioData.length);
-        for (let i = 0; i < audioData.length; i++) {
-          audioArray[i] = audioData.charCodeAt(i);
-        }
-        const audioBlob = new Blob([audioArray], { type: 'audio/mp3' });
-        const audioUrl = URL.createObjectURL(audioBlob);
-        if (audioRef.current) {
-          audioRef.current.src = audioUrl;
-          audioRef.current.onended = () => setPlayingIndex(null);
-          audioRef.current.onplay = () => {
-            setPlayingIndex(index);
-            setAudioLoadingIndex(null);
-          };
-          audioRef.current.play();
-        }
+      // Short answers are played straight from the streamed response so audio
+      // starts with the first sentence; long ones are posted and played once fetched
+      let audioUrl;
+      if (text.length <= MAX_STREAMED_TTS_CHARS) {
+        audioUrl = `${API_URL}/api/v1/voice/text-to-speech?text=${encodeURIComponent(text)}`;
       } else {
-        setAudioLoadingIndex(null);
+        const response = await api.post('/api/v1/voice/text-to-speech', { text }, { responseType: 'blob' });
+        audioUrl = URL.createObjectURL(response.data);
+      }
+      if (audioRef.current) {
+        audioRef.current.src = audioUrl;
+        audioRef.current.onended = () => setPlayingIndex(null);
+        audioRef.current.onplay = () => {
+          setPlayingIndex(index);
+          setAudioLoadingIndex(null);
+        };
+        audioRef.current.onerror = () => {
+          setError('Error playing audio response.');
+          setPlayingIndex(null);
+          setAudioLoadingIndex(null);
+        };
+        await audioRef.current.play();
       }
     } catch (error) {
       setError('Error playing audio response.');